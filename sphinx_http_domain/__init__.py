@@ -13,35 +13,43 @@
 """
 
 from itertools import izip
+from os import path
 
-import subprocess
-import json
+import copy
+import hashlib
+import time
 
-from docutils.nodes import literal, Text
+from docutils.nodes import literal, literal_block, Text
 
+from sphinx import addnodes
 from sphinx.locale import l_
 from sphinx.domains import Domain, ObjType
 from sphinx.roles import XRefRole
 from sphinx.util.nodes import make_refnode
-from sphinx.ext import autodoc
 
-from sphinx_http_domain.directives import HTTPMethod, HTTPResponse, HTTPExample
-from sphinx_http_domain.nodes import (desc_http_method, desc_http_url,
-                                      desc_http_path, desc_http_patharg,
-                                      desc_http_query, desc_http_queryparam,
-                                      desc_http_fragment, desc_http_response,
-                                      desc_http_example)
+from sphinx_http_domain.apidiff import fingerprint
+from sphinx_http_domain.builders import (HTTPCheckBuilder, HTTPLoadBuilder,
+                                         HTTPCatalogBuilder)
+from sphinx_http_domain.directives import (HTTPMethod, HTTPResponse, HTTPExample,
+                                           HTTPAutoRoutes, HTTPOpenAPI,
+                                           HTTPResponseMatrix)
+from sphinx_http_domain.indices import make_routing_indices, route_key
+from sphinx_http_domain.inventory import InventoryTable, missing_reference
+from sphinx_http_domain.responsematrix import (resolve_response_matrices,
+                                               response_rows)
+from sphinx_http_domain.routes import save_cache as save_route_cache
+from sphinx_http_domain.search import write_endpoint_index
+from sphinx_http_domain.nodes import http_nodes, http_responsematrix
 
-import pprint
+__version__ = '0.2'
 
-tokens = None
-debug = False
-pp = pprint.PrettyPrinter(indent=4)
+STATIC_PATH = path.join(path.dirname(path.abspath(__file__)), 'static')
 
 class HTTPDomain(Domain):
   """HTTP language domain."""
   name = 'http'
   label = 'HTTP'
+  data_version = 5
   object_types = {
     'method': ObjType(l_('method'), 'method'),
     'response': ObjType(l_('response'), 'response'),
@@ -50,7 +58,10 @@ class HTTPDomain(Domain):
   directives = {
     'method': HTTPMethod,
     'response': HTTPResponse,
-    'example': HTTPExample
+    'example': HTTPExample,
+    'autoroutes': HTTPAutoRoutes,
+    'openapi': HTTPOpenAPI,
+    'responsematrix': HTTPResponseMatrix,
   }
   roles = {
     'method': XRefRole(),
@@ -58,24 +69,198 @@ class HTTPDomain(Domain):
     'example': XRefRole()
   }
   initial_data = {
-    'method': {}, # name -> docname, sig, title, method
+    'method': {}, # name -> docname, sig, title, method, latency budget
     'response': {}, # name -> docname, sig, title
     'example': {}, # name -> docname, sig, title
+    'curl': {}, # name -> docname, method label, curl string
+    'digests': {}, # docname -> docname, digest, (type, name) of its entries
+    'refs': {}, # docname -> docname, set of (type, target) it references
+    'fields': {}, # anchor -> docname, doc fields of the entry
+    # anchor -> docname, signature, fields digest, output digest
+    'fingerprints': {},
   }
 
+  def __init__(self, env):
+    if self.name not in env.domaindata:
+      # Domain only copies initial_data shallowly, which would share its
+      # dicts between all the builds of this process
+      env.domaindata[self.name] = copy.deepcopy(self.initial_data)
+      env.domaindata[self.name]['version'] = self.data_version
+    super(HTTPDomain, self).__init__(env)
+    # docname -> (digest, entries) of the documents cleared in this build
+    self.cleared = {}
+    # (type, name) of the entries added, removed or changed in this build
+    self.changed = set()
+    self._indices = None
+    # bumped whenever self.data changes, to invalidate cached objects
+    self.generation = 0
+    self._objects = (None, [])
+    self._routes = (None, {})
+    self._response_rows = (None, [])
+    self._inventory = (None, None)
+
+  @property
+  def indices(self):
+    """The routing table, split as configured by ``http_index_split``."""
+    split = tuple(self.env.config.http_index_split)
+    if self._indices is None or self._indices[0] != split:
+      self._indices = (split, make_routing_indices(split))
+    return self._indices[1]
+
   def clear_doc(self, docname):
     """Remove traces of a document from self.data."""
+    if docname in self.data['digests']:
+      self.cleared[docname] = self.data['digests'][docname][1:]
+    self.generation += 1
     for typ in self.initial_data:
       for name, entry in self.data[typ].items():
         if entry[0] == docname:
           del self.data[typ][name]
 
+  def note_entries(self, docname, doctree):
+    """
+    Records a digest of the entries described in *docname*, and the HTTP
+    cross-references it contains, so that a change to an entry only
+    rewrites the documents referring to it, and the fingerprint of each
+    entry, to compare builds.
+    """
+    entries = []
+    fingerprints = self.data['fingerprints']
+    for node in doctree.traverse(addnodes.desc):
+      if node.get('domain') != self.name:
+        continue
+      typ = node['objtype']
+      output = None
+      if typ == 'example':
+        output = [block.astext() for block in node.traverse(literal_block)]
+      for signode in node.traverse(addnodes.desc_signature):
+        for anchor in signode['ids']:
+          if not anchor.startswith(typ + '-'):
+            continue
+          name = anchor[len(typ) + 1:]
+          entries.append((typ, name))
+          entry = self.data[typ].get(name)
+          if entry is not None and entry[0] == docname:
+            fields = self.data['fields'].get(anchor, (None, []))[1]
+            fingerprints[anchor] = (
+              (docname,) + fingerprint(entry[1], fields, output))
+    digest = hashlib.sha1(repr(sorted(
+      (entry, self.data[entry[0]].get(entry[1]),
+       self.data['fields'].get(entry[0] + '-' + entry[1]))
+      for entry in entries
+    ))).hexdigest()
+    self.note_digest(docname, digest, entries)
+    refs = set()
+    for node in doctree.traverse(addnodes.pending_xref):
+      if node.get('refdomain') != self.name:
+        continue
+      typ, target = node['reftype'], node['reftarget']
+      refs.add((typ, target))
+      name = self.find_name(typ, target) if typ == 'method' else None
+      if name is not None:
+        # a method referred to by route, should it be removed later
+        refs.add((typ, name))
+    if doctree.traverse(http_responsematrix):
+      # a response matrix refers to every method
+      refs.add(('method', '*'))
+    self.data['refs'][docname] = (docname, refs)
+    self.generation += 1
+
+  def note_digest(self, docname, digest, entries):
+    """Marks the entries of *docname* as changed, if its digest changed."""
+    self.data['digests'][docname] = (docname, digest, entries)
+    previous = self.cleared.pop(docname, None)
+    if previous is None or previous[0] != digest:
+      self.changed.update(entries)
+      if previous is not None:
+        self.changed.update(previous[1])
+
+  def merge_domaindata(self, docnames, otherdata):
+    """Merges in the data of *docnames*, read by another process."""
+    for typ in self.initial_data:
+      if typ == 'digests':
+        continue
+      for name, entry in otherdata[typ].iteritems():
+        if entry[0] in docnames:
+          self.data[typ][name] = entry
+    for docname, digest, entries in otherdata['digests'].itervalues():
+      if docname in docnames:
+        self.note_digest(docname, digest, entries)
+    self.generation += 1
+
+  def get_updated_docs(self):
+    """
+    Returns the documents referring to an entry that was added, removed or
+    changed in this build.
+    """
+    # documents cleared but not read again have been removed
+    for digest, entries in self.cleared.itervalues():
+      self.changed.update(entries)
+    self.cleared = {}
+    changed, self.changed = self.changed, set()
+    if not changed:
+      return []
+    changed.update((typ, '*') for typ, _ in list(changed))
+    updated = []
+    for docname, (_, refs) in self.data['refs'].iteritems():
+      # methods referred to by route are compared by their current name
+      names = set(('method', self.find_name('method', target))
+                  for typ, target in refs if typ == 'method')
+      if refs & changed or names & changed:
+        updated.append(docname)
+    return updated
+
+  def routes(self):
+    """Returns a dict mapping the route keys of the methods to their names."""
+    if self._routes[0] != self.generation:
+      routes = {}
+      for name, entry in sorted(self.data['method'].iteritems()):
+        key = route_key(entry[1])
+        if key is not None:
+          routes.setdefault(key, name)
+      self._routes = (self.generation, routes)
+    return self._routes[1]
+
+  def response_rows(self):
+    """
+    Returns the (path, method, name, docname, status codes) of the
+    methods, sorted by path and method.
+    """
+    if self._response_rows[0] != self.generation:
+      self._response_rows = (self.generation,
+                             response_rows(self.data['method'],
+                                           self.data['fields']))
+    return self._response_rows[1]
+
+  def inventory_table(self, inventory, named_inventory):
+    """
+    Returns the lookup table of the HTTP entries of the intersphinx
+    *inventory*, built once for each inventory loaded.
+    """
+    if self._inventory[0] is not inventory:
+      self._inventory = (inventory,
+                         InventoryTable(inventory, named_inventory))
+    return self._inventory[1]
+
+  def find_name(self, typ, target):
+    """
+    Returns the name of the *typ* entry *target*, which may also be the
+    route of a method, or None.
+    """
+    if target in self.data[typ]:
+      return target
+    if typ == 'method':
+      key = route_key(target)
+      if key is not None:
+        return self.routes().get(key)
+    return None
+
   def find_xref(self, env, typ, target):
     """Returns a self.data entry for *target*, according to *typ*."""
-    try:
-      return self.data[typ][target]
-    except KeyError:
+    name = self.find_name(typ, target)
+    if name is None:
       return None
+    return self.data[typ][name]
 
   def resolve_xref(self, env, fromdocname, builder,
                    typ, target, node, contnode):
@@ -86,8 +271,9 @@ class HTTPDomain(Domain):
 
     If no resolution can be found, returns None.
     """
-    match = self.find_xref(env, typ, target)
-    if match:
+    name = self.find_name(typ, target)
+    if name is not None:
+      match = self.data[typ][name]
       docname = match[0]
       sig = match[1]
       title = match[2]
@@ -104,7 +290,24 @@ class HTTPDomain(Domain):
         contnode = nodetype(child, child)
         # Return the new reference node
       return make_refnode(builder, fromdocname, docname,
-        typ + '-' + target, contnode, sig)
+        typ + '-' + name, contnode, sig)
+
+  def resolve_any_xref(self, env, fromdocname, builder, target,
+                       node, contnode):
+    """
+    Resolve the ``pending_xref`` *node* of an ``:any:`` role with the
+    given *target*.
+
+    Returns a list of (role, reference node) tuples, one for each entry
+    type *target* is found in.
+    """
+    results = []
+    for typ in self.object_types:
+      refnode = self.resolve_xref(env, fromdocname, builder, typ, target,
+                                  node, contnode)
+      if refnode is not None:
+        results.append(('http:' + self.role_for_objtype(typ), refnode))
+    return results
 
   def get_objects(self):
     """
@@ -124,226 +327,163 @@ class HTTPDomain(Domain):
       - 2: object is unimportant (placed after full-text matches)
       - -1: object should not show up in search at all
     """
-    # Method descriptions
-    for typ in self.initial_data:
-      for name, entry in self.data[typ].iteritems():
-        docname = entry[0]
-        yield(name, name, typ, docname, typ + '-' + name, 0)
+    if self._objects[0] != self.generation:
+      objects = []
+      for typ, priority in (('method', 0), ('response', 1), ('example', 1)):
+        for name, entry in sorted(self.data[typ].iteritems()):
+          docname, sig = entry[:2]
+          objects.append((name, sig, typ, docname, typ + '-' + name,
+                          priority))
+      self._objects = (self.generation, objects)
+    return self._objects[1]
+
+
+###############################################################################
+
+def note_http_entries(app, doctree):
+  app.env.get_domain('http').note_entries(app.env.docname, doctree)
 
 
-class RestDocumenter(autodoc.MethodDocumenter):
+def get_updated_docs(app, env):
+  return env.get_domain('http').get_updated_docs()
+
+
+def add_static_file(app, filename):
+  """Adds the static script *filename* to the pages of this build."""
+  if STATIC_PATH not in app.config.html_static_path:
+    app.config.html_static_path.append(STATIC_PATH)
+  if getattr(app, 'http_scripts', None) is None:
+    app.http_scripts = []
+  if '_static/' + filename not in app.http_scripts:
+    app.http_scripts.append('_static/' + filename)
+
+
+def add_page_scripts(app, pagename, templatename, context, doctree):
+  # not app.add_javascript, whose scripts are shared by every build of the
+  # process: the pages get a copy of the scripts of the builder
+  scripts = getattr(app, 'http_scripts', None)
+  if scripts and 'script_files' in context:
+    context['script_files'] = context['script_files'] + [
+      script for script in scripts if script not in context['script_files']]
+
+
+def add_watch_reload(app):
+  if app.config.http_watch_reload and app.builder.format == 'html':
+    add_static_file(app, 'http-watch.js')
+
+
+def add_endpoint_search(app):
+  if app.config.http_endpoint_search and app.builder.format == 'html':
+    add_static_file(app, 'http-search.js')
+
+
+def write_watch_stamp(app, exception):
+  if (exception is None and app.config.http_watch_reload and
+      app.builder.format == 'html'):
+    with open(path.join(app.outdir, '_static', 'http-watch.json'), 'w') as f:
+      f.write('%r' % time.time())
+
+
+def setup_autorest(app):
+  # the autorest directive is only available along with autodoc
+  if 'sphinx.ext.autodoc' in app._extensions:
+    from sphinx_http_domain import autorest
+    autorest.setup(app)
+
+
+def executes_examples(app):
+  """Whether the build of *app* executes examples or cleans up after them."""
+  return bool(app.config.auto_curl or app.config.curl_cleanup or
+              getattr(app.builder, 'replays_examples', False))
+
+
+class ParallelReadSafe(object):
   """
-  Used to displaying REST API endpoints, which are included in the API source
-  code, without displaying the directive headers, which contain the actual
-  handler class names and method signatures. We want to keep those away from
-  users and only document the endpoints.
+  The ``parallel_read_safe`` metadata of the extension, only known once the
+  configuration has been read: examples executed in other processes would
+  escape the example cache, the latency history and the cleanup registry.
   """
-  objtype = "rest"
-  content_indent = ""
-
-  def add_directive_header(self, sig):
-    # don't print the header
-    pass
-
-
-def convert_curl_string_to_curl_command(curlString):
-  # remove line break chars and split into components
-  curl = curlString.replace('\\', '').split()
-  # the problem is that this will split apart legit words in the -d value,
-  # so we look for that block and squish them back together
-  startIndex = None
-  for i, subCmd in enumerate(curl):
-    if subCmd == '-d':
-      startIndex = i
-      break
-
-  endIndex = len(curl) - 1
-
-  subStrings = []
-  if startIndex:
-    for i in reversed(range(startIndex + 1, endIndex + 1)):
-      subStrings.append(curl.pop(i))
-    subStrings.reverse()
-    curl.insert(startIndex + 1, ' '.join(subStrings))
-
-  return curl
-
-
-def process_one_curl_request(curl_request):
-  try:
-    response = execute_curl_request(curl_request)
-  except Exception as e:
-    raise Exception("Error executing curl during API doc build.\n\t" +
-                    "Curl call details are: " + ' '.join(curl_request) + '\n\t' +
-                    "Errors from API: " + str(e))
-  return translate_response(response)
-
-
-def extract_curl_requests(doclines):
-  startIndex = None
-  endIndex = None
-  requestParseOccurring = False
-  additions = []
-
-  for i, line in enumerate(doclines):
-    if 'Curl request' in line:
-#      print 'found Curl request line ' + str(i) + ' current processing? ' + str(requestParseOccurring)
-      if not requestParseOccurring:
-        requestParseOccurring = True
-      else:
-#        print 'processing one curl request between lines ' + str(startIndex + 1) + ' and ' + str(i-2)
-        # this means we have a start index, and ran into another 'Curl request'
-        # so we need to process the proceeding one before moving along
-        newLines = process_one_curl_request(
-          convert_curl_string_to_curl_command(
-            ' '.join(doclines[startIndex + 1:i - 2])
-          )
-        )
-        additions.append((i - 3, newLines))
-      startIndex = i
-    else:
-      endIndex = i
-
-  newLines = process_one_curl_request(
-    convert_curl_string_to_curl_command(
-      ' '.join(doclines[startIndex + 1:endIndex])
-    )
-  )
-
-  additions.append((len(doclines) - 1, newLines))
-
-#  pp.pprint(additions)
-  currentInjectionHeight = 0
-
-  for addition in additions:
-    # inject the response addition in the right place, based on the index in
-    # the tuple
-    insertionIndex = addition[0] + currentInjectionHeight
-    insertionLines = addition[1]
-    doclines[insertionIndex:insertionIndex] = insertionLines
-    currentInjectionHeight += len(insertionLines)
-
-
-
-def make_command_substitutions(cmd):
-  global tokens
-  for i, item in enumerate(cmd):
-    for token in tokens:
-      value = tokens[token]
-      if token in item:
-        cmd[i] = cmd[i].replace(token, value)
-
-
-
-def escape_double_quotes_in_curl_data(curlRequest):
-  for i, v in enumerate(curlRequest):
-    if v == '-d':
-      curlRequest[i + 1] = curlRequest[i + 1][1:-1]
-      break
-
-
-def execute_curl_request(request):
-  global tokens
-  if debug:
-    print '\nexecuting curl request:'
-    pp.pprint(request)
-  make_command_substitutions(request)
-  escape_double_quotes_in_curl_data(request)
-  if debug:
-    print 'Processed request: '
-    pp.pprint(request)
-  result = None
-  body = None
-  # add the -i option to print the response headers as well
-  request.append('-i')
-  print '\n' + ' '.join(request)
-  raw = subprocess.Popen(request, stdout=subprocess.PIPE, stderr=subprocess.PIPE).communicate()[0]
-  print '\tresponse received'
-  raw = raw.split('\r\n\r\n')
-
-  if debug:
-    pp.pprint(raw)
-
-  result = { 'headers': raw[0] }
-  if raw[1]:
-    # Replace the API_KEY given back with the response with a dummy value
-    rawResponse = raw[1].replace(tokens['{API_KEY}'], 'API_KEY')
-
-    result['body'] = json.loads(rawResponse)
-
-    body = result['body']
-    if 'errors' in body:
-      raise Exception("Error executing curl during API doc build.\n\t" +
-                      "Curl call details are: " + ' '.join(request) + '\n\t' +
-                      "Errors from API: " + str(body['errors']))
-
-  return result
-
-
-def translate_response(response):
-  headers = response['headers']
-  newResponse = None
-  if 'body' in response:
-    body = response['body']
-    newResponse = json.dumps(body, ensure_ascii=False, indent=2).split('\n')
-
-  newLines = []
-  # add the header lines before the code
-  newLines.append('')
-  newLines.append('  Curl response:')
-  newLines.append('')
-  newLines.append('  .. code-block:: http')
-  newLines.append('')
-  for hdr in headers.split('\n'):
-    newLines.append('    ' + hdr)
-
-  if newResponse is not None:
-    newLines.append('')
-    newLines.append('  .. code-block:: json')
-    newLines.append('')
-    # add 4 spaces to each response line to properly indent it within code-block
-    for i, line in enumerate(newResponse):
-      newResponse[i] = '    ' + line
-    # extra buffer line between sections
-    newResponse.append('')
-    # add response to end of doclines
-    newLines.extend(newResponse)
-
-  return newLines
-
-
-def replace_curl_examples(app, what, name, obj, options, lines):
-  if not app.config.auto_curl:
-    return
-  if what == 'rest':
-    extract_curl_requests(lines)
 
+  def __init__(self, app):
+    self.app = app
 
-def emit_rest_setup(app):
-  global tokens, debug
-  tokens = app.emit_firstresult('rest-setup')
-  debug = app.config.debug
+  def __nonzero__(self):
+    return not executes_examples(self.app)
+
+
+def setup_examples(app):
+  """Loads the curl example execution layer, if the build needs it."""
+  if not executes_examples(app):
+    return
+  from sphinx_http_domain import execution
+  execution.emit_rest_setup(app)
+  app.connect('build-finished', execution.check_latencies)
+  app.connect('build-finished', execution.save_examples)
+  app.connect('build-finished', execution.teardown)
 
-###############################################################################
 
 def setup(app):
-  app.add_autodocumenter(RestDocumenter)
+  app.require_sphinx('1.3')
   app.add_domain(HTTPDomain)
+  app.add_builder(HTTPCheckBuilder)
+  app.add_builder(HTTPLoadBuilder)
+  app.add_builder(HTTPCatalogBuilder)
   app.add_event('rest-setup')
-  desc_http_method.contribute_to_app(app)
-  desc_http_url.contribute_to_app(app)
-  desc_http_path.contribute_to_app(app)
-  desc_http_patharg.contribute_to_app(app)
-  desc_http_query.contribute_to_app(app)
-  desc_http_queryparam.contribute_to_app(app)
-  desc_http_fragment.contribute_to_app(app)
-  desc_http_response.contribute_to_app(app)
-  desc_http_example.contribute_to_app(app)
+  app.add_event('rest-auth')
+  app.add_event('rest-cleanup')
+  for node in http_nodes:
+    node.contribute_to_app(app)
+  app.add_node(http_responsematrix)
   app.add_config_value('auto_curl', False, False)
   app.add_config_value('debug', False, False)
-  app.connect('builder-inited', emit_rest_setup)
-  app.connect('autodoc-process-docstring', replace_curl_examples)
-  app.connect('build-finished', teardown)
-
-def teardown(app, what):
-  print '\n\nTODO: Remove all projects, models, streams, and swarms for apidocs@numenta.com.\n\n'
+  app.add_config_value('curl_header_allow', None, False)
+  app.add_config_value('curl_header_deny', [], False)
+  app.add_config_value('curl_json_masks', {}, False)
+  app.add_config_value('curl_scrub', [], False)
+  app.add_config_value('curl_sort_keys', False, False)
+  app.add_config_value('curl_auth_header', None, False)
+  app.add_config_value('curl_auth_refresh', 60, False)
+  app.add_config_value('curl_backend', 'curl', False)
+  app.add_config_value('curl_wsgi_app', None, False)
+  app.add_config_value('httpcheck_base_url', None, False)
+  app.add_config_value('httpcheck_workers', 5, False)
+  app.add_config_value('httpcheck_timeout', 0, False)
+  app.add_config_value('curl_cache', False, False)
+  app.add_config_value('curl_batch_workers', 1, False)
+  app.add_config_value('curl_stream_events', 10, False)
+  app.add_config_value('curl_stream_bytes', 1024 * 1024, False)
+  app.add_config_value('curl_stream_timeout', 5, False)
+  app.add_config_value('curl_latency_history', None, False)
+  app.add_config_value('curl_latency_window', 10, False)
+  app.add_config_value('curl_latency_regression', None, False)
+  app.add_config_value('curl_cleanup', [], False)
+  app.add_config_value('curl_cleanup_rules', [], False)
+  app.add_config_value('curl_cleanup_workers', 4, False)
+  app.add_config_value('curl_cleanup_retries', 2, False)
+  app.add_config_value('httpload_base_url', None, False)
+  app.add_config_value('httpload_concurrency', 10, False)
+  app.add_config_value('httpload_rate', 0, False)
+  app.add_config_value('httpload_iterations', 100, False)
+  app.add_config_value('httpload_timeout', 0, False)
+  app.add_config_value('http_watch_reload', False, False)
+  app.add_config_value('http_index_prefix_depth', 1, 'html')
+  app.add_config_value('http_index_split', [], 'html')
+  app.add_config_value('http_index_duplicates', True, 'env')
+  app.add_config_value('http_endpoint_search', True, 'html')
+  app.add_config_value('autorest_mode', 'import', 'env')
+  app.add_config_value('httpcatalog_title', None, False)
+  app.add_config_value('httpcatalog_servers', [], False)
+  app.connect('builder-inited', setup_autorest)
+  app.connect('builder-inited', setup_examples)
+  app.connect('builder-inited', add_watch_reload)
+  app.connect('builder-inited', add_endpoint_search)
+  app.connect('doctree-read', note_http_entries)
+  app.connect('env-updated', get_updated_docs)
+  app.connect('missing-reference', missing_reference)
+  app.connect('doctree-resolved', resolve_response_matrices)
+  app.connect('html-page-context', add_page_scripts)
+  app.connect('build-finished', write_watch_stamp)
+  app.connect('build-finished', write_endpoint_index)
+  app.connect('build-finished', save_route_cache)
+  return {'version': __version__,
+          'parallel_read_safe': ParallelReadSafe(app)}
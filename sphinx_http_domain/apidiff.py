@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Differences of the documented API between two builds.
+
+    The domain keeps a fingerprint of each entry: its signature, a digest
+    of its doc fields and, for examples, a digest of their normalized
+    output.  Comparing the fingerprint tables of two builds tells which
+    entries were added, removed or changed, without reading any source::
+
+        python -m sphinx_http_domain.apidiff old/doctrees new/doctrees
+
+    Only the doc fields of the changed entries are compared further, to
+    tell which parameters and responses changed.
+"""
+
+import cPickle as pickle
+import hashlib
+import json
+import optparse
+import os
+import sys
+
+
+def digest(value):
+  return hashlib.sha1(json.dumps(value, sort_keys=True)).hexdigest()
+
+
+def fingerprint(signature, fields, output=None):
+  """
+  Returns the (signature, fields digest, output digest) of an entry,
+  given its doc fields and, for an example, the text of its output
+  blocks.  The order of the fields does not matter.
+  """
+  return (signature, digest(sorted(fields)),
+          digest(output) if output is not None else None)
+
+
+def load_fingerprints(doctreedir):
+  """
+  Returns the fingerprint table and the doc fields of the build whose
+  doctrees are in *doctreedir*.
+  """
+  with open(os.path.join(doctreedir, 'environment.pickle'), 'rb') as f:
+    env = pickle.load(f)
+  data = env.domaindata.get('http', {})
+  if 'fingerprints' not in data:
+    raise ValueError('%s was built without entry fingerprints' % doctreedir)
+  return data['fingerprints'], data['fields']
+
+
+def diff_fingerprints(old, new):
+  """
+  Returns the anchors of the entries added, removed and changed from the
+  fingerprint table *old* to *new*.
+  """
+  added = [anchor for anchor in new if anchor not in old]
+  removed = [anchor for anchor in old if anchor not in new]
+  changed = [anchor for anchor, value in new.iteritems()
+             if anchor in old and old[anchor][1:] != value[1:]]
+  return sorted(added), sorted(removed), sorted(changed)
+
+
+def field_changes(old, new):
+  """
+  Returns the ('+', '-' or '~', field type, name) of the doc fields
+  added, removed and changed from the fields *old* to *new*.
+  """
+  old = dict(((field[0], field[2]), field) for field in old)
+  new = dict(((field[0], field[2]), field) for field in new)
+  changes = [('+',) + key for key in new if key not in old]
+  changes.extend(('-',) + key for key in old if key not in new)
+  changes.extend(('~',) + key for key in new
+                 if key in old and old[key] != new[key])
+  changes.sort(key=lambda change: (change[1], change[2], change[0]))
+  return changes
+
+
+def api_diff(old, new, old_fields, new_fields):
+  """
+  Returns the differences between the fingerprint tables *old* and *new*
+  of two builds, given their doc fields, as a JSON-serializable dict.
+  """
+  added, removed, changed = diff_fingerprints(old, new)
+
+  def describe(anchor, table):
+    typ, _, name = anchor.partition('-')
+    return {'type': typ, 'name': name, 'signature': table[anchor][1]}
+
+  result = {'added': [describe(anchor, new) for anchor in added],
+            'removed': [describe(anchor, old) for anchor in removed],
+            'changed': []}
+  for anchor in changed:
+    change = describe(anchor, new)
+    if old[anchor][1] != new[anchor][1]:
+      change['old_signature'] = old[anchor][1]
+    if old[anchor][2] != new[anchor][2]:
+      change['fields'] = [
+        {'change': sign, 'field': field, 'name': name}
+        for sign, field, name in field_changes(
+          old_fields.get(anchor, (None, []))[1],
+          new_fields.get(anchor, (None, []))[1])]
+    change['output'] = old[anchor][3] != new[anchor][3]
+    result['changed'].append(change)
+  return result
+
+
+def format_diff(diff):
+  """Returns the lines of a plain text report of *diff*."""
+  lines = []
+  for title, key in (('Added', 'added'), ('Removed', 'removed'),
+                     ('Changed', 'changed')):
+    if not diff[key]:
+      continue
+    lines.append('%s:' % title)
+    for entry in diff[key]:
+      lines.append('  %s %s' % (entry['type'], entry['signature']))
+      if 'old_signature' in entry:
+        lines.append('    was %s' % entry['old_signature'])
+      for field in entry.get('fields', ()):
+        lines.append(('    %s %s %s' % (field['change'], field['field'],
+                                        field['name'] or '')).rstrip())
+      if entry.get('output'):
+        lines.append('    ~ example output')
+  return lines
+
+
+def main(argv=sys.argv):
+  parser = optparse.OptionParser(
+    usage='%prog [options] OLD_DOCTREEDIR NEW_DOCTREEDIR')
+  parser.add_option('-j', '--json', dest='json', action='store_true',
+                    help='write the differences as JSON')
+  options, args = parser.parse_args(argv[1:])
+  if len(args) != 2:
+    parser.error('OLD_DOCTREEDIR and NEW_DOCTREEDIR are required')
+  try:
+    old, old_fields = load_fingerprints(args[0])
+    new, new_fields = load_fingerprints(args[1])
+  except (IOError, ValueError), err:
+    parser.error(str(err))
+  diff = api_diff(old, new, old_fields, new_fields)
+  if options.json:
+    print json.dumps(diff, indent=2, sort_keys=True)
+  else:
+    for line in format_diff(diff):
+      print line.encode('utf-8')
+  # like diff(1), exits with 1 if the builds differ
+  return 1 if diff['added'] or diff['removed'] or diff['changed'] else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Authenticated session shared by the curl examples of a build.
+
+    Handlers of the ``rest-auth`` event authenticate once per target
+    environment, instead of every example authenticating on its own, and
+    again shortly before the credentials expire, so that long builds do
+    not fail halfway through.
+"""
+
+import threading
+import time
+
+
+class AuthenticationError(Exception):
+  """An authenticated request was refused with ``401 Unauthorized``."""
+
+
+class AuthSession(object):
+  """
+  The tokens returned by *authenticate*, shared by all the examples run
+  against one environment, from any thread.
+
+  *authenticate* returns a dict of tokens, such as ``{'{TOKEN}': 'abc'}``,
+  or a (tokens, lifetime in seconds) pair, or None if the environment
+  needs no session.  It is only called once the tokens are first needed,
+  so builds that execute no example do not authenticate, and again
+  *margin* seconds before tokens with a lifetime expire.
+  """
+
+  def __init__(self, authenticate, margin=60):
+    self.authenticate = authenticate
+    self.margin = margin
+    self.lock = threading.Lock()
+    self.current = None
+    self.expires = None
+
+  def update(self, result):
+    """Takes the tokens of a *result* of *authenticate*."""
+    if isinstance(result, tuple):
+      tokens, lifetime = result
+    else:
+      tokens, lifetime = result, None
+    self.current = dict(tokens or {})
+    self.expires = time.time() + lifetime if lifetime else None
+
+  def tokens(self):
+    """
+    Returns the current tokens, authenticating again if they expire, or
+    None without a session.
+    """
+    with self.lock:
+      if self.current is None or (self.expires is not None and
+                                  time.time() >= self.expires - self.margin):
+        self.update(self.authenticate())
+      return self.current or None
+
+  def invalidate(self, tokens):
+    """
+    Drops the *tokens* that were refused, unless they have already been
+    replaced by another thread.
+    """
+    with self.lock:
+      if self.current is tokens:
+        self.current = None
+
+
+def make_sessions(app, environments, margin=60):
+  """
+  Returns the :class:`AuthSession` of each (name, tokens) environment, by
+  name.  They call the ``rest-auth`` handlers with the name, None without
+  environments, and the tokens of the environment.
+  """
+  sessions = {}
+  for name, tokens in environments:
+    sessions[name] = AuthSession(lambda name=name, tokens=tokens:
+                                 app.emit_firstresult('rest-auth', name,
+                                                      tokens),
+                                 margin)
+  return sessions
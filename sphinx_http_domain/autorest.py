@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    The ``autorest`` autodoc directive, set up only for projects using
+    ``sphinx.ext.autodoc``.
+
+    With ``autorest_mode = 'ast'``, the docstrings of the handlers are read
+    from their source files, without importing them.
+"""
+
+from sphinx.ext import autodoc
+from sphinx.util import force_decode
+from sphinx.util.docstrings import prepare_docstring
+
+from sphinx_http_domain.sourceindex import get_source_index, save_source_index
+
+
+class RestDocumenter(autodoc.MethodDocumenter):
+  """
+  Used to displaying REST API endpoints, which are included in the API source
+  code, without displaying the directive headers, which contain the actual
+  handler class names and method signatures. We want to keep those away from
+  users and only document the endpoints.
+  """
+  objtype = "rest"
+  content_indent = ""
+
+  def add_directive_header(self, sig):
+    # don't print the header
+    pass
+
+  def generate(self, more_content=None, real_modname=None,
+               check_module=False, all_members=False):
+    if self.env.config.autorest_mode != 'ast':
+      return autodoc.MethodDocumenter.generate(
+        self, more_content, real_modname, check_module, all_members)
+    if not self.parse_name():
+      self.directive.warn('don\'t know which module to read for '
+                          'autodocumenting %r' % self.name)
+      return
+    found = get_source_index(self.env.app).lookup(self.modname,
+                                                  self.objpath)
+    if found is None:
+      self.directive.warn('autorest can\'t find %r in the source of %r' %
+                          ('.'.join(self.objpath), self.modname))
+      return
+    filename, docstring = found
+    self.directive.filename_set.add(filename)
+    self.object = None
+    sourcename = u'%s:docstring of %s' % (filename, self.fullname)
+    self.add_line(u'', sourcename)
+    docstrings = []
+    if docstring is not None:
+      docstrings.append(prepare_docstring(force_decode(docstring, None)))
+    for i, line in enumerate(self.process_doc(docstrings)):
+      self.add_line(line, sourcename, i)
+    if more_content:
+      for line, src in zip(more_content.data, more_content.items):
+        self.add_line(line, src[0], src[1])
+
+
+def process_docstring(app, what, name, obj, options, lines):
+  if what != 'rest':
+    return
+  from sphinx_http_domain.execution import replace_curl_examples
+  replace_curl_examples(app, what, name, obj, options, lines)
+
+
+def setup(app):
+  app.add_autodocumenter(RestDocumenter)
+  app.connect('autodoc-process-docstring', process_docstring)
+  if app.config.autorest_mode == 'ast':
+    get_source_index(app)
+    app.connect('build-finished', save_source_index)
@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Execution backends for curl examples.
+
+    A backend takes a parsed curl command (a list of arguments, as built by
+    ``convert_curl_string_to_curl_command``) and returns the raw response,
+    i.e. the status line and headers, a blank line, and the body, exactly as
+    ``curl -i`` prints it.  Streaming responses are only captured within
+    the backend's ``StreamLimits``.
+"""
+
+import os
+import Queue
+import select
+import subprocess
+import sys
+import threading
+import time
+from StringIO import StringIO
+from urllib import unquote
+from urlparse import urlsplit
+
+from sphinx_http_domain.streaming import StreamCapture, StreamLimits
+from sphinx_http_domain.utils import import_object
+
+
+# curl flags that take no value and have no meaning outside of a terminal
+_curl_flags = ('-i', '--include', '-s', '--silent', '-S', '--show-error',
+               '-k', '--insecure', '-v', '--verbose', '-L', '--location',
+               '-g', '--globoff', '--compressed', '-N', '--no-buffer')
+# curl options whose value does not affect the request itself
+_curl_ignored_options = ('--connect-timeout', '-o', '--output', '-w',
+                         '--write-out')
+
+
+def next_value(args):
+  """
+  Returns the next option value from *args*, without its quotes.
+
+  ``convert_curl_string_to_curl_command`` splits the command on whitespace,
+  so quoted values such as ``-H 'Accept: text/plain'`` are glued back
+  together here.
+  """
+  value = next(args)
+  quote = value[:1]
+  if quote in ('"', "'"):
+    while len(value) < 2 or not value.endswith(quote):
+      value += ' ' + next(args)
+    value = value[1:-1]
+  return value
+
+
+class CurlRequest(object):
+  """
+  The HTTP request described by a curl command, and the seconds it is
+  given to complete, if limited.
+  """
+
+  def __init__(self, method, url, headers, data, auth, timeout=None):
+    self.method = method
+    self.url = url
+    self.headers = headers
+    self.data = data
+    self.auth = auth
+    self.timeout = timeout
+
+  @classmethod
+  def from_command(cls, request):
+    """Parses a curl argument list into a ``CurlRequest``."""
+    method = None
+    url = None
+    headers = []
+    data = None
+    auth = None
+    timeout = None
+    args = iter(request[1:])
+    for arg in args:
+      if arg in ('-X', '--request'):
+        method = next_value(args).upper()
+      elif arg in ('-H', '--header'):
+        name, _, value = next_value(args).partition(':')
+        headers.append((name.strip(), value.strip()))
+      elif arg in ('-d', '--data', '--data-binary', '--data-raw'):
+        data = next(args)
+      elif arg in ('-u', '--user'):
+        auth = next_value(args)
+      elif arg in ('-m', '--max-time'):
+        timeout = float(next_value(args))
+      elif arg in _curl_ignored_options:
+        next(args)
+      elif arg in _curl_flags:
+        continue
+      elif arg.startswith('-'):
+        raise ValueError('Unsupported curl option: %s' % arg)
+      else:
+        url = arg.strip('\'"')
+    if url is None:
+      raise ValueError('No URL in curl command: %s' % ' '.join(request))
+    if method is None:
+      method = 'POST' if data is not None else 'GET'
+    return cls(method, url, headers, data, auth, timeout)
+
+
+class CurlBackend(object):
+  """Runs each example through a real ``curl`` process."""
+
+  def __init__(self, limits=None):
+    self.limits = limits or StreamLimits()
+
+  def execute(self, request):
+    capture = StreamCapture(self.limits)
+    # with --no-buffer, curl writes out each part of a stream as it comes
+    with open(os.devnull, 'w') as devnull:
+      process = subprocess.Popen(request[:1] + ['-N'] + request[1:],
+                                 stdout=subprocess.PIPE, stderr=devnull)
+    fd = process.stdout.fileno()
+    try:
+      # read whatever is available, so that a stream is seen event by
+      # event, until the stream is captured or curl is done
+      while select.select([fd], [], [], capture.timeout())[0]:
+        chunk = os.read(fd, 65536)
+        if not chunk or not capture.feed(chunk):
+          break
+    finally:
+      if process.poll() is None:
+        process.kill()
+      process.stdout.close()
+      process.wait()
+    return capture.result()
+
+
+class WSGIBackend(object):
+  """
+  Calls a WSGI application in-process, without opening any socket.
+
+  *application* is the WSGI callable, or a ``'package.module:attribute'``
+  string naming it.  Like curl, the backend gives up on a request once
+  its ``--max-time`` is out, with whatever it has received; the
+  application itself is left to finish in the background.
+  """
+
+  def __init__(self, application, limits=None):
+    if isinstance(application, basestring):
+      application = import_object(application)
+    self.application = application
+    self.limits = limits or StreamLimits()
+
+  def make_environ(self, req):
+    scheme, netloc, path, query, _ = urlsplit(req.url)
+    host, _, port = netloc.rpartition('@')[2].partition(':')
+    body = req.data or ''
+    environ = {
+      'REQUEST_METHOD': req.method,
+      'SCRIPT_NAME': '',
+      'PATH_INFO': unquote(path) or '/',
+      'QUERY_STRING': query,
+      'SERVER_NAME': host or 'localhost',
+      'SERVER_PORT': port or ('443' if scheme == 'https' else '80'),
+      'SERVER_PROTOCOL': 'HTTP/1.1',
+      'HTTP_HOST': netloc,
+      'CONTENT_LENGTH': str(len(body)),
+      'wsgi.version': (1, 0),
+      'wsgi.url_scheme': scheme or 'http',
+      'wsgi.input': StringIO(body),
+      'wsgi.errors': sys.stderr,
+      # batch workers, environments and replay builders call it at once
+      'wsgi.multithread': True,
+      'wsgi.multiprocess': False,
+      'wsgi.run_once': False,
+    }
+    if req.data is not None:
+      environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+    if req.auth is not None:
+      environ['HTTP_AUTHORIZATION'] = ('Basic ' +
+                                       req.auth.encode('base64').strip())
+    for name, value in req.headers:
+      key = name.upper().replace('-', '_')
+      if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+        environ[key] = value
+      else:
+        environ['HTTP_' + key] = value
+    return environ
+
+  def execute(self, request):
+    req = CurlRequest.from_command(request)
+    response = {}
+    # the application runs in a thread of its own, so that a stream that
+    # stalls can be given up on once its time is out
+    chunks = Queue.Queue()
+    stop = threading.Event()
+
+    def start_response(status, headers, exc_info=None):
+      if exc_info is not None and response:
+        raise exc_info[0], exc_info[1], exc_info[2]
+      response['status'] = status
+      response['headers'] = headers
+      return chunks.put
+
+    def run():
+      try:
+        app_iter = self.application(self.make_environ(req), start_response)
+        try:
+          for chunk in app_iter:
+            chunks.put(chunk)
+            if stop.is_set():
+              break
+        finally:
+          if hasattr(app_iter, 'close'):
+            app_iter.close()
+      except Exception:
+        response['error'] = sys.exc_info()
+      chunks.put(None)
+
+    def head():
+      lines = ['HTTP/1.1 ' + response['status']]
+      lines.extend('%s: %s' % header for header in response['headers'])
+      return '\r\n'.join(lines) + '\r\n\r\n'
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    capture = StreamCapture(self.limits)
+    deadline = time.time() + req.timeout if req.timeout else None
+    try:
+      while True:
+        wait = capture.timeout()
+        if deadline is not None:
+          left = max(0, deadline - time.time())
+          wait = left if wait is None else min(wait, left)
+        try:
+          chunk = chunks.get(timeout=wait)
+        except Queue.Empty:
+          break
+        if chunk is None:
+          if 'error' in response:
+            error = response['error']
+            raise error[0], error[1], error[2]
+          break
+        if not capture.chunks:
+          capture.feed(head())
+        if not capture.feed(chunk):
+          break
+    finally:
+      stop.set()
+    # timed out before the application started its response, curl prints
+    # nothing either
+    if not capture.chunks and 'status' in response:
+      capture.feed(head())
+    return capture.result()
+
+
+def make_backend(config):
+  """Returns the backend selected by the ``curl_backend`` config value."""
+  limits = StreamLimits.from_config(config)
+  if config.curl_backend == 'curl':
+    return CurlBackend(limits)
+  if config.curl_backend == 'wsgi':
+    if config.curl_wsgi_app is None:
+      raise ValueError("curl_backend = 'wsgi' requires curl_wsgi_app")
+    return WSGIBackend(config.curl_wsgi_app, limits)
+  raise ValueError('Unknown curl_backend: %r' % config.curl_backend)
+
+
+def split_response(raw):
+  """
+  Splits raw ``curl -i`` output into (status code, headers, body).
+
+  Interim ``1xx`` responses are skipped.  The status code is None when
+  *raw* does not start with a status line, e.g. when curl failed.
+  """
+  while True:
+    headers, _, body = raw.partition('\r\n\r\n')
+    status = None
+    parts = headers.split(None, 2)
+    if len(parts) > 1 and parts[0].startswith('HTTP/') and parts[1].isdigit():
+      status = int(parts[1])
+    if status is not None and 100 <= status < 200 and body:
+      raw = body
+      continue
+    return status, headers, body
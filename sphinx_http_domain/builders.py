@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Builders for the HTTP domain.
+"""
+
+import codecs
+import heapq
+import json
+import threading
+import time
+from os import path
+from urlparse import urlsplit
+
+from sphinx.builders import Builder
+from sphinx.util.console import bold, darkgray, darkgreen, red
+from sphinx.util.osutil import ensuredir
+
+from sphinx_http_domain.catalog import doc_records, record_key, write_catalog
+from sphinx_http_domain.utils import run_concurrently
+
+
+def rebase_command(command, base_url):
+  """
+  Points the URL of a parsed curl *command* at *base_url*, keeping its path
+  and query string.
+  """
+  if not base_url:
+    return command
+  for i, arg in enumerate(command):
+    if '://' in arg:
+      quote = arg[0] if arg[0] in '\'"' else ''
+      _, _, urlpath, query, _ = urlsplit(arg.strip('\'"'))
+      url = base_url.rstrip('/') + urlpath
+      if query:
+        url += '?' + query
+      command[i] = quote + url + quote
+      break
+  return command
+
+
+class ExampleReplayBuilder(Builder):
+  """
+  Base class for builders that replay the curl examples recorded in the
+  HTTP domain, instead of writing out documents.
+  """
+  # Don't execute examples while reading, the builder replays them
+  replays_examples = True
+
+  def get_target_uri(self, docname, typ=None):
+    return ''
+
+  def get_outdated_docs(self):
+    return self.env.found_docs
+
+  def prepare_writing(self, docnames):
+    return
+
+  def write_doc(self, docname, doctree):
+    return
+
+  def collect_examples(self, docnames):
+    """Returns sorted (key, docname, label, curl) tuples for *docnames*."""
+    examples = []
+    for key, (docname, label, curl) in \
+        self.env.domaindata['http']['curl'].iteritems():
+      if docname in docnames:
+        examples.append((key, docname, label, curl))
+    examples.sort()
+    return examples
+
+  def prepare_command(self, curl, base_url=None, timeout=None):
+    """Returns the curl argument list for *curl*, ready to be executed."""
+    # imported here, so that builds not replaying examples do not load the
+    # execution layer
+    from sphinx_http_domain import execution
+    context = execution.get_context(self.app)
+    command = execution.convert_curl_string_to_curl_command(curl)
+    execution.prepare_curl_request(context, command)
+    rebase_command(command, base_url)
+    command.append('-i')
+    if timeout:
+      command.extend(['--max-time', str(timeout)])
+    return command
+
+  def execute_command(self, command):
+    """
+    Executes *command* with the tokens of the authenticated session, if
+    any, and returns a dict with its status code, latency (seconds),
+    response size (bytes) and error message, if any.
+    """
+    from sphinx_http_domain import execution
+    context = execution.get_context(self.app)
+    # the session tokens are only added now, as they may have been
+    # refreshed since the command was prepared
+    authenticated = list(command)
+    auth = execution.apply_auth(context, authenticated)
+    result = self.send_command(authenticated)
+    if auth is not None and result['status'] == 401:
+      # revoked, or expired early: authenticate again, once
+      context.session().invalidate(auth)
+      authenticated = list(command)
+      execution.apply_auth(context, authenticated)
+      result = self.send_command(authenticated)
+    return result
+
+  def send_command(self, command):
+    from sphinx_http_domain import execution
+    from sphinx_http_domain.backends import split_response
+    context = execution.get_context(self.app)
+    result = {'status': None, 'latency': None, 'size': None, 'error': None}
+    start = time.time()
+    try:
+      raw = context.backend.execute(command)
+    except Exception, e:
+      result['error'] = str(e)
+      return result
+    result['latency'] = time.time() - start
+    status, _, body = split_response(raw)
+    result['status'] = status
+    result['size'] = len(body)
+    if status is None:
+      result['error'] = 'no response'
+    elif status >= 400:
+      result['error'] = 'HTTP status %d' % status
+    else:
+      try:
+        parsed = json.loads(body) if body else None
+      except ValueError:
+        parsed = None
+      errors = parsed.get('errors') if isinstance(parsed, dict) else None
+      if errors:
+        result['error'] = 'Errors from API: %s' % errors
+      elif parsed is not None and context.cleanup is not None:
+        # resources created by replayed requests are removed at the end of
+        # the build too
+        context.cleanup.register_response(command, {'body': parsed})
+    return result
+
+
+class HTTPCheckBuilder(ExampleReplayBuilder):
+  """
+  Executes every documented curl example against ``httpcheck_base_url``
+  and reports its status, latency and error, like ``linkcheck`` does for
+  external links.
+  """
+  name = 'httpcheck'
+
+  def write(self, build_docnames, updated_docnames, method='update'):
+    # Nothing is rendered: the check runs straight off the domain data.
+    if build_docnames is None or build_docnames == ['__all__']:
+      build_docnames = self.env.found_docs
+    docnames = set(build_docnames) | set(updated_docnames)
+    examples = self.collect_examples(docnames)
+    self.info(bold('checking %d examples... ' % len(examples)))
+
+    def check(example):
+      key, docname, label, curl = example
+      command = self.prepare_command(curl, self.config.httpcheck_base_url,
+                                     self.config.httpcheck_timeout)
+      result = self.execute_command(command)
+      result.update(key=key, docname=docname, label=label,
+                    command=' '.join(command))
+      return result
+
+    results = run_concurrently(check, examples,
+                               self.config.httpcheck_workers)
+    checked = set()
+    with codecs.open(path.join(self.outdir, 'output.txt'), 'w', 'utf-8') as txt:
+      with codecs.open(path.join(self.outdir, 'output.json'), 'w',
+                       'utf-8') as js:
+        for example, result in zip(examples, results):
+          if isinstance(result, Exception):
+            key, docname, label, curl = example
+            result = {'key': key, 'docname': docname, 'label': label,
+                      'command': curl, 'status': None, 'latency': None,
+                      'size': None, 'error': str(result)}
+          checked.add(result['label'])
+          self.process_result(result, txt)
+          js.write(json.dumps(result) + '\n')
+        self.report_untested(checked, docnames, txt, js)
+
+  def process_result(self, result, txt):
+    label = result['label'] or result['key']
+    if result['error']:
+      self.warn('%s: broken example %s - %s' %
+                (self.env.doc2path(result['docname']), label,
+                 result['error']))
+      self.app.statuscode = 1
+      txt.write(u'%s: [broken] %s: %s\n' %
+                (result['docname'], label, result['error']))
+    else:
+      self.info(darkgreen('ok        ') + label +
+                darkgray(' - %d %.3fs' % (result['status'],
+                                          result['latency'])))
+      txt.write(u'%s: [ok] %s: %d %.3fs\n' %
+                (result['docname'], label, result['status'],
+                 result['latency']))
+
+  def report_untested(self, checked, docnames, txt, js):
+    """Lists the ``http:method`` entries that have no curl example."""
+    for label, entry in sorted(self.env.domaindata['http']['method'].items()):
+      if label in checked or entry[0] not in docnames:
+        continue
+      self.info(red('untested  ') + label)
+      txt.write(u'%s: [untested] %s\n' % (entry[0], label))
+      js.write(json.dumps({'docname': entry[0], 'label': label,
+                           'status': None, 'error': 'untested'}) + '\n')
+
+
+def percentile(values, pct):
+  """Returns the *pct* percentile of the sorted list *values*."""
+  if not values:
+    return None
+  index = int(round(pct / 100.0 * (len(values) - 1)))
+  return values[index]
+
+
+class RateLimiter(object):
+  """Spaces out calls so that at most *rate* happen per second."""
+
+  def __init__(self, rate):
+    self.interval = 1.0 / rate if rate else 0
+    self.next_time = time.time()
+    self.lock = threading.Lock()
+
+  def wait(self):
+    if not self.interval:
+      return
+    with self.lock:
+      now = time.time()
+      delay = self.next_time - now
+      self.next_time = max(now, self.next_time) + self.interval
+    if delay > 0:
+      time.sleep(delay)
+
+
+class HTTPLoadBuilder(ExampleReplayBuilder):
+  """
+  Replays every documented curl example against ``httpload_base_url`` at a
+  configurable concurrency and request rate, and reports the throughput
+  and the p50/p95/p99 latencies of each ``http:method``.
+  """
+  name = 'httpload'
+
+  def write(self, build_docnames, updated_docnames, method='update'):
+    if build_docnames is None or build_docnames == ['__all__']:
+      build_docnames = self.env.found_docs
+    docnames = set(build_docnames) | set(updated_docnames)
+    examples = self.collect_examples(docnames)
+    commands = [(label or key,
+                 self.prepare_command(curl, self.config.httpload_base_url,
+                                      self.config.httpload_timeout))
+                for key, docname, label, curl in examples]
+    jobs = commands * self.config.httpload_iterations
+    self.info(bold('replaying %d requests over %d examples... ' %
+                   (len(jobs), len(commands))))
+
+    limiter = RateLimiter(self.config.httpload_rate)
+
+    def replay(job):
+      label, command = job
+      limiter.wait()
+      return label, self.execute_command(list(command))
+
+    start = time.time()
+    results = run_concurrently(replay, jobs,
+                               self.config.httpload_concurrency)
+    elapsed = time.time() - start
+
+    stats = {}
+    for job, result in zip(jobs, results):
+      if isinstance(result, Exception):
+        result = (job[0], {'latency': None, 'error': str(result)})
+      label, result = result
+      entry = stats.setdefault(label, {'latencies': [], 'errors': 0})
+      if result['error'] or result['latency'] is None:
+        entry['errors'] += 1
+      else:
+        entry['latencies'].append(result['latency'])
+    self.write_report(stats, len(jobs), elapsed)
+
+  def write_report(self, stats, total, elapsed):
+    report = {'requests': total, 'elapsed': elapsed,
+              'throughput': total / elapsed if elapsed else None,
+              'methods': {}}
+    lines = [u'%-40s %8s %8s %10s %10s %10s' %
+             ('label', 'requests', 'errors', 'p50', 'p95', 'p99')]
+    for label, entry in sorted(stats.items()):
+      latencies = sorted(entry['latencies'])
+      row = {'requests': len(latencies) + entry['errors'],
+             'errors': entry['errors'],
+             'p50': percentile(latencies, 50),
+             'p95': percentile(latencies, 95),
+             'p99': percentile(latencies, 99)}
+      report['methods'][label] = row
+      lines.append(u'%-40s %8d %8d %10s %10s %10s' % (
+        (label, row['requests'], row['errors']) +
+        tuple(('%.4f' % row[p]) if row[p] is not None else '-'
+              for p in ('p50', 'p95', 'p99'))))
+      if entry['errors']:
+        self.warn('%s: %d of %d requests failed' %
+                  (label, entry['errors'], row['requests']))
+    lines.append(u'')
+    lines.append(u'%d requests in %.3fs (%.1f requests/s)' %
+                 (total, elapsed, report['throughput'] or 0))
+    for line in lines:
+      self.info(line)
+    with codecs.open(path.join(self.outdir, 'output.txt'), 'w', 'utf-8') as f:
+      f.write(u'\n'.join(lines) + u'\n')
+    with codecs.open(path.join(self.outdir, 'output.json'), 'w', 'utf-8') as f:
+      f.write(json.dumps(report, indent=2))
+
+
+def read_fragment(filename):
+  """Yields the (key, record) pairs of a catalog fragment, in order."""
+  with open(filename) as f:
+    for line in f:
+      yield tuple(json.loads(line))
+
+
+class HTTPCatalogBuilder(Builder):
+  """
+  Writes the HTTP entries as an OpenAPI 3 document, ``openapi.json``, and
+  as a JSON-lines catalog, ``catalog.jsonl``.
+
+  The records of each document go to a fragment of their own, so that
+  incremental builds only write the fragments of the documents that
+  changed.  Both outputs are then streamed from a merge of the sorted
+  fragments, without loading them all.
+  """
+  name = 'httpcatalog'
+
+  def init(self):
+    self.fragmentdir = path.join(self.outdir, 'fragments')
+
+  def get_target_uri(self, docname, typ=None):
+    return ''
+
+  def fragment_path(self, docname):
+    return path.join(self.fragmentdir, docname + '.jsonl')
+
+  def get_outdated_docs(self):
+    for docname in self.env.found_docs:
+      try:
+        mtime = path.getmtime(self.fragment_path(docname))
+      except OSError:
+        yield docname
+        continue
+      if self.env.all_docs.get(docname, mtime + 1) > mtime:
+        yield docname
+
+  def prepare_writing(self, docnames):
+    return
+
+  def write_doc(self, docname, doctree):
+    return
+
+  def write(self, build_docnames, updated_docnames, method='update'):
+    # Nothing is rendered: fragments come straight off the domain data.
+    if build_docnames is None or build_docnames == ['__all__']:
+      build_docnames = self.env.found_docs
+    docnames = sorted(set(build_docnames) | set(updated_docnames))
+    self.info(bold('writing %d catalog fragments... ' % len(docnames)))
+    domaindata = self.env.domaindata['http']
+    for docname in docnames:
+      filename = self.fragment_path(docname)
+      ensuredir(path.dirname(filename))
+      with open(filename, 'w') as f:
+        for record in doc_records(domaindata, docname):
+          f.write(json.dumps([record_key(record), record]) + '\n')
+
+  def finish(self):
+    self.info(bold('writing openapi.json and catalog.jsonl... '), nonl=True)
+    fragments = [read_fragment(self.fragment_path(docname))
+                 for docname in sorted(self.env.found_docs)]
+    records = (record for key, record in heapq.merge(*fragments))
+    info = {'title': self.config.httpcatalog_title or self.config.project,
+            'version': self.config.version or '0'}
+    with open(path.join(self.outdir, 'openapi.json'), 'w') as openapi:
+      with open(path.join(self.outdir, 'catalog.jsonl'), 'w') as catalog:
+        write_catalog(records, openapi, catalog, info,
+                      self.config.httpcatalog_servers)
+    self.info('done')
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Machine-readable catalog of the HTTP entries: JSON-lines records, and
+    the OpenAPI 3 document built from them.
+"""
+
+import json
+
+from sphinx_http_domain.indices import route_path
+
+# the order of the entry types in the catalog
+_type_order = {'method': 0, 'response': 1, 'example': 2}
+
+# OpenAPI types of the value types of doc fields
+_schema_types = {
+  'int': 'integer', 'integer': 'integer', 'long': 'integer',
+  'float': 'number', 'double': 'number', 'number': 'number',
+  'bool': 'boolean', 'boolean': 'boolean',
+  'str': 'string', 'string': 'string', 'unicode': 'string',
+  'list': 'array', 'array': 'array',
+  'dict': 'object', 'object': 'object',
+}
+
+
+def schema(typ):
+  """Returns the OpenAPI schema of a doc field value type."""
+  result = {'type': _schema_types.get((typ or '').lower(), 'string')}
+  if typ and typ.lower() not in _schema_types:
+    result['format'] = typ
+  return result
+
+
+def record_key(record):
+  return [_type_order[record['type']], record.get('path', ''),
+          record.get('method', ''), record['name']]
+
+
+def doc_records(domaindata, docname):
+  """
+  Returns the catalog records of the HTTP entries described in *docname*,
+  sorted by :func:`record_key`.
+  """
+  records = []
+  for typ in _type_order:
+    for name, entry in domaindata[typ].iteritems():
+      if entry[0] != docname:
+        continue
+      anchor = typ + '-' + name
+      fields = domaindata['fields'].get(anchor, (None, []))[1]
+      record = {
+        'type': typ, 'name': name, 'docname': docname, 'anchor': anchor,
+        'signature': entry[1], 'title': entry[2],
+        'fields': [{'field': field, 'type': valuetype, 'name': fieldname,
+                    'description': description}
+                   for field, valuetype, fieldname, description in fields],
+      }
+      if typ == 'method':
+        route = route_path(entry[1])
+        if route is None:
+          continue
+        record['method'], record['path'] = route
+      records.append(record)
+  records.sort(key=record_key)
+  return records
+
+
+def operation(record):
+  """Returns the OpenAPI operation object of a method record."""
+  result = {'operationId': record['name'],
+            'x-sphinx-ref': '%s#%s' % (record['docname'], record['anchor'])}
+  if record['title'] != record['signature']:
+    result['summary'] = record['title']
+  parameters = []
+  responses = {}
+  for field in record['fields']:
+    if field['field'] == 'argument':
+      parameters.append({'name': field['name'], 'in': 'path',
+                         'required': True})
+    elif field['field'] in ('parameter', 'optional_parameter'):
+      parameters.append({'name': field['name'], 'in': 'query',
+                         'required': field['field'] == 'parameter'})
+    elif field['field'] == 'response' and field['name']:
+      responses[field['name']] = {'description': field['description']}
+      continue
+    else:
+      continue
+    parameters[-1]['schema'] = schema(field['type'])
+    if field['description']:
+      parameters[-1]['description'] = field['description']
+  if parameters:
+    result['parameters'] = parameters
+  result['responses'] = responses or {'default': {'description': ''}}
+  return result
+
+
+def response_schema(record):
+  """Returns the OpenAPI schema of a response record."""
+  result = {'type': 'object', 'title': record['title']}
+  properties = {}
+  for field in record['fields']:
+    if field['field'] == 'data' and field['name']:
+      properties[field['name']] = schema(field['type'])
+      if field['description']:
+        properties[field['name']]['description'] = field['description']
+  if properties:
+    result['properties'] = properties
+  return result
+
+
+def write_catalog(records, openapi, catalog, info, servers=()):
+  """
+  Writes the *records*, sorted by :func:`record_key`, as an OpenAPI
+  document to the file *openapi*, and as JSON lines to the file
+  *catalog*, one record at a time.
+  """
+  openapi.write('{"openapi": "3.0.3", "info": %s' % json.dumps(info))
+  if servers:
+    openapi.write(', "servers": %s' %
+                  json.dumps([{'url': url} for url in servers]))
+  openapi.write(', "paths": {')
+  route = None
+  path = None
+  section = 'paths'
+  count = 0
+  for record in records:
+    catalog.write(json.dumps(record, sort_keys=True) + '\n')
+    if record['type'] == 'method':
+      if (record['path'], record['method']) == route:
+        # the same route documented twice
+        continue
+      if record['path'] != path:
+        openapi.write('%s%s: {' % ('}, ' if path is not None else '',
+                                   json.dumps(record['path'])))
+        path = record['path']
+      else:
+        openapi.write(', ')
+      route = (record['path'], record['method'])
+      openapi.write('%s: %s' % (json.dumps(record['method'].lower()),
+                                json.dumps(operation(record), sort_keys=True)))
+    elif record['type'] == 'response':
+      if section == 'paths':
+        openapi.write('%s}, "components": {"schemas": {' %
+                      ('}' if path is not None else ''))
+        section = 'schemas'
+        count = 0
+      openapi.write('%s%s: %s' % (', ' if count else '',
+                                  json.dumps(record['name']),
+                                  json.dumps(response_schema(record),
+                                             sort_keys=True)))
+      count += 1
+  if section == 'paths':
+    openapi.write('%s}}\n' % ('}' if path is not None else ''))
+  else:
+    openapi.write('}}}\n')
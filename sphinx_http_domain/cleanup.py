@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Cleanup of server-side resources created by executed curl examples.
+"""
+
+import re
+import threading
+import time
+
+from sphinx_http_domain.backends import CurlRequest
+from sphinx_http_domain.normalize import find_json_path, parse_json_path
+from sphinx_http_domain.utils import run_concurrently
+
+
+class CleanupRule(object):
+  """
+  Registers a delete command for every resource created by a matching
+  request.
+
+  *match* is a regular expression searched in the request URL, *method*
+  the request method, *id* a JSON path to the created resource's ID in the
+  response body, and *delete* the curl command that removes it.  ``{ID}``
+  and the named groups of *match* are substituted in *delete*.
+  """
+
+  def __init__(self, match, delete, id='id', method='POST'):
+    self.match = re.compile(match)
+    self.delete = delete
+    self.id = parse_json_path(id)
+    self.method = method.upper()
+
+  def commands(self, request, body):
+    m = self.match.search(request.url)
+    if m is None or request.method != self.method:
+      return
+    for value in find_json_path(body, self.id):
+      command = self.delete.replace('{ID}', unicode(value))
+      for name, group in m.groupdict().items():
+        command = command.replace('{%s}' % name, group or '')
+      yield command
+
+
+class CleanupRegistry(object):
+  """
+  Collects the curl commands that delete resources created during the
+  build, with the target environment they were created in, and runs them
+  concurrently once the build has finished.
+  """
+
+  def __init__(self, rules=(), workers=4, retries=2):
+    self.rules = [CleanupRule(**rule) for rule in rules]
+    self.workers = workers
+    self.retries = retries
+    self.commands = []  # command, environment
+    # the commands registered, for the many responses of load tests
+    self.registered = set()
+    self.lock = threading.Lock()
+
+  def register(self, command, environment=None):
+    """
+    Registers a curl *command* to run at the end of the build against
+    *environment*, by default the first one.
+    """
+    with self.lock:
+      if (command, environment) not in self.registered:
+        self.registered.add((command, environment))
+        self.commands.append((command, environment))
+
+  def register_response(self, request, response, environment=None):
+    """
+    Registers the delete commands of the rules matching an executed
+    *request* (a curl argument list) and its *response*, in *environment*.
+    Requests with curl options that can't be parsed match no rule.
+    """
+    if not self.rules or 'body' not in response:
+      return
+    try:
+      request = CurlRequest.from_command(request)
+    except ValueError:
+      return
+    for rule in self.rules:
+      for command in rule.commands(request, response['body']):
+        self.register(command, environment)
+
+  def run(self, execute):
+    """
+    Runs every registered command through *execute*, with its environment,
+    retrying failures.
+
+    Returns a list of (command, environment, error) tuples for the commands
+    that still failed after all retries.
+    """
+    def attempt((command, environment)):
+      for retry in range(self.retries + 1):
+        try:
+          execute(command, environment)
+          return None
+        except Exception, e:
+          error = e
+          if retry < self.retries:
+            time.sleep(0.5 * 2 ** retry)
+      return error
+
+    with self.lock:
+      commands, self.commands = self.commands, []
+      self.registered = set()
+    errors = run_concurrently(attempt, commands, self.workers)
+    return [(command, environment, error)
+            for (command, environment), error in zip(commands, errors)
+            if error is not None]
@@ -6,30 +6,115 @@
     Directives for the HTTP domain.
 """
 
+import os
 import re
 from urlparse import urlsplit
 
-from docutils.nodes import literal, strong, Text
-from docutils.parsers.rst import directives
+from docutils.nodes import literal, paragraph, strong, Text
+from docutils.parsers.rst import Directive, directives
+from docutils.statemachine import StringList
 
 from sphinx.locale import l_, _
 from sphinx.directives import ObjectDescription
+from sphinx.util import force_decode
 from sphinx.util.docfields import TypedField
+from sphinx.util.docstrings import prepare_docstring
+from sphinx.util.nodes import nested_parse_with_titles
 
 from sphinx_http_domain.docfields import NoArgGroupedField, ResponseField
 from sphinx_http_domain.nodes import (desc_http_method, desc_http_url,
                                       desc_http_path, desc_http_patharg,
                                       desc_http_query, desc_http_queryparam,
                                       desc_http_fragment, desc_http_response,
-                                      desc_http_example)
-from sphinx_http_domain.utils import slugify, slugify_url
+                                      desc_http_example, http_responsematrix)
+from sphinx_http_domain import openapi, routes
+from sphinx_http_domain.utils import parse_matrix, slugify, slugify_url
 
 try:
   from urlparse import parse_qsl
 except ImportError:
   from cgi import parse_qsl
 
+def duration(argument):
+  """
+  Converts a duration option such as ``250``, ``250ms`` or ``1.5s`` into
+  seconds.  Bare numbers are milliseconds.
+  """
+  value = directives.unchanged_required(argument).strip().lower()
+  try:
+    if value.endswith('ms'):
+      return float(value[:-2]) / 1000
+    if value.endswith('s'):
+      return float(value[:-1])
+    return float(value) / 1000
+  except ValueError:
+    raise ValueError('invalid duration: %r' % argument)
+
+
+def boolean(argument):
+  """
+  Converts a yes/no option into a boolean.  An empty option means yes.
+  """
+  if argument is None or not argument.strip():
+    return True
+  value = argument.strip().lower()
+  if value in ('yes', 'true', 'on', '1'):
+    return True
+  if value in ('no', 'false', 'off', '0'):
+    return False
+  raise ValueError('"%s" unknown; choose from "yes" or "no"' % argument)
+
+
 class HTTPDescription(ObjectDescription):
+  # RE for doc field lines, such as ":arg integer id: An id"
+  field_re = re.compile(r'^:([^:\s]+)(?:\s+([^:]+?))?:(?:\s+(.*))?$')
+
+  def run(self):
+    self.fields = self.collect_fields()
+    return super(HTTPDescription, self).run()
+
+  def collect_fields(self):
+    """
+    Returns the doc fields of the content as [field type, value type,
+    name, description] lists, such as ``['argument', 'integer', 'id',
+    'An id']``, in the order they appear.
+    """
+    names = {}
+    typenames = {}
+    for fieldtype in self.doc_field_types:
+      for name in fieldtype.names:
+        names[name] = fieldtype.name
+      for name in getattr(fieldtype, 'typenames', ()):
+        typenames[name] = fieldtype.name
+    fields = []
+    types = {}
+    field = None
+    for line in self.content:
+      m = self.field_re.match(line)
+      if m is None:
+        if field is not None and line[:1].isspace() and line.strip():
+          # continuation of a multi-line description
+          field[3] = (field[3] + ' ' + line.strip()).strip()
+        else:
+          field = None
+        continue
+      key, arg, description = m.groups()
+      field = None
+      if key in names:
+        parts = arg.split() if arg else []
+        typ = parts[0] if len(parts) > 1 else None
+        name = parts[-1] if parts else None
+        field = [names[key], typ, name, description or '']
+        fields.append(field)
+      elif key in typenames and arg:
+        types[typenames[key], arg.strip()] = description
+    for field in fields:
+      if field[1] is None:
+        field[1] = types.get((field[0], field[2]))
+      if field[0] == 'response' and not field[3]:
+        field[3] = ResponseField.status_codes.get(field[2], '')
+    return fields
+
   def get_anchor(self, name, sig):
     """
     Returns anchor for cross-reference IDs.
@@ -85,6 +170,8 @@ class HTTPDescription(ObjectDescription):
           self.lineno
         )
       data[id] = entry
+      self.env.domaindata['http']['fields'][anchor] = (
+        self.env.docname, getattr(self, 'fields', []))
 
   def add_index(self, anchor, name, sig):
     """
@@ -106,6 +193,7 @@ class HTTPMethod(HTTPDescription):
     'noindex': directives.flag,
     'title': directives.unchanged,
     'label-name': directives.unchanged,
+    'latency-budget': duration,
     }
   doc_field_types = [
     TypedField('argument', label=l_('Path arguments'),
@@ -135,8 +223,8 @@ class HTTPMethod(HTTPDescription):
   sig_re = re.compile(
     (
       r'^'
-      r'(?:(GET|POST|PUT|DELETE)\s+)?'  # HTTP method
-      r'(.+)'                           # URL
+      r'(?:(GET|POST|PUT|PATCH|DELETE|HEAD|OPTIONS)\s+)?'  # HTTP method
+      r'(.+)'                                              # URL
       r'\s*$'
       ),
     re.IGNORECASE
@@ -236,7 +324,8 @@ class HTTPMethod(HTTPDescription):
     *name* is whatever :meth:`handle_signature()` returned.
     """
     method, _, _, title = name
-    return (self.env.docname, sig, title, method)
+    return (self.env.docname, sig, title, method,
+            self.options.get('latency-budget'))
 
   def get_id(self, name, sig):
     """
@@ -253,7 +342,7 @@ class HTTPMethod(HTTPDescription):
     *name* is whatever :meth:`handle_signature()` returned.
     """
     method, url, id, title = name
-    if title != sig:
+    if title != sig and self.env.config.http_index_duplicates:
       self.indexnode['entries'].append(('single',
                                         _("%s (HTTP method)") % title,
                                         anchor, anchor))
@@ -312,6 +401,8 @@ class HTTPResponse(HTTPDescription):
     self.indexnode['entries'].append(('single',
                                       _("%s (HTTP response)") % sig,
                                       anchor, anchor))
+    if not self.env.config.http_index_duplicates:
+      return
     self.indexnode['entries'].append(('single',
                                       _("HTTP response; %s") % sig,
                                       anchor, anchor))
@@ -325,7 +416,11 @@ class HTTPExample(HTTPDescription):
   nodetype = strong
 
   option_spec = {
-    'noindex': directives.flag
+    'noindex': directives.flag,
+    'cache': boolean,
+    'timeout': directives.positive_int,
+    'skip': directives.flag,
+    'matrix': parse_matrix,
   }
   doc_field_types = [
     TypedField('curl',
@@ -337,6 +432,79 @@ class HTTPExample(HTTPDescription):
     )
   ]
 
+  # RE for the first line of a :curl: field
+  curl_field_re = re.compile(r'^(\s*):curl(?:\s+[^:]*)?:\s*(.*)$')
+
+  def find_curl_fields(self):
+    """Returns the curl command of each ``:curl:`` field in the content."""
+    curls = []
+    lines = list(self.content)
+    i = 0
+    while i < len(lines):
+      m = self.curl_field_re.match(lines[i])
+      i += 1
+      if m is None:
+        continue
+      indent = len(m.group(1))
+      parts = [m.group(2)]
+      # the field body continues on the more indented lines
+      while (i < len(lines) and lines[i].strip() and
+             len(lines[i]) - len(lines[i].lstrip()) > indent):
+        parts.append(lines[i].strip())
+        i += 1
+      curls.append(' '.join(parts))
+    return curls
+
+  def run_examples(self):
+    """
+    Records the ``:curl:`` fields in the domain data, unless the example
+    is skipped, and, with ``auto_curl``, executes them and appends their
+    responses to the content.
+    """
+    # imported here, as the execution layer itself depends on this module
+    from sphinx_http_domain import execution
+    curls = self.find_curl_fields()
+    if not curls or 'skip' in self.options:
+      # skipped examples are not recorded either, so builders replaying
+      # examples skip them too
+      return
+    matrix = self.options.get('matrix')
+    name = slugify(self.arguments[0])
+    data = self.env.domaindata['http']['curl']
+    for n, curl in enumerate(curls):
+      expanded = execution.matrix_curls(curl, matrix)
+      for m, curl in enumerate(expanded):
+        key = '%s-%s#%d' % (self.typ, name, n)
+        if len(expanded) > 1:
+          key += '.%d' % m
+        data[key] = (self.env.docname, None, curl)
+    if (not self.env.config.auto_curl or
+        getattr(self.env.app.builder, 'replays_examples', False)):
+      return
+    options = {'cache': self.options.get('cache'),
+               'timeout': self.options.get('timeout'),
+               'matrix': matrix}
+    # measured under their recorded key, for the latency history
+    responses = execution.get_context(self.env.app).executor.run(
+      [(execution.convert_curl_string_to_curl_command(curl),
+        '%s-%s#%d' % (self.typ, name, n), options)
+       for n, curl in enumerate(curls)]
+    )
+    source, offset = self.content.info(len(self.content) - 1)
+    # detach the content from the document, so the responses are only
+    # parsed as part of this directive
+    self.content = StringList(self.content)
+    for newLines in responses:
+      for line in newLines:
+        # responses are indented for docstrings, not for directive content
+        self.content.append(line[2:] if line.startswith('  ') else line,
+                            source, offset)
+
+  def run(self):
+    self.env = self.state.document.settings.env
+    self.run_examples()
+    return super(HTTPExample, self).run()
+
   def handle_signature(self, sig, signode):
     """
     Transform an HTTP example into RST nodes.
@@ -358,6 +526,132 @@ class HTTPExample(HTTPDescription):
     self.indexnode['entries'].append(('single',
                                       _("%s (HTTP example)") % sig,
                                       anchor, anchor))
+    if not self.env.config.http_index_duplicates:
+      return
     self.indexnode['entries'].append(('single',
                                       _("HTTP example; %s") % sig,
-                                      anchor, anchor))
\ No newline at end of file
+                                      anchor, anchor))
+
+
+class HTTPAutoRoutes(Directive):
+  """
+  Documents every route of a route table, given as the path of a route
+  file, relative to the document, or as a Python object path.
+
+  Each route becomes an ``http:method`` entry described by the docstring
+  of its handler, unless that docstring declares its own entry.
+  """
+  required_arguments = 1
+  option_spec = {
+    'prefix': directives.unchanged,
+    'methods': directives.unchanged,
+    }
+
+  method_directive_re = re.compile(r'^\s*\.\.\s+http:method::')
+
+  def route_lines(self, method, path, docstring):
+    """Returns the lines documenting one route."""
+    lines = []
+    if docstring:
+      lines = prepare_docstring(force_decode(docstring, None))
+    if any('Curl request' in line for line in lines):
+      # imported here, as the execution layer itself depends on this module
+      from sphinx_http_domain import execution
+      name = 'autoroutes-%s' % slugify_url(method.lower() + '-' + path)
+      execution.replace_curl_examples(self.env.app, 'rest', name, None, {},
+                                      lines)
+    if any(self.method_directive_re.match(line) for line in lines):
+      return lines
+    return (['.. http:method:: %s %s' % (method, path), ''] +
+            ['   ' + line if line else '' for line in lines] + [''])
+
+  def run(self):
+    self.env = self.state.document.settings.env
+    source = self.arguments[0]
+    _, filename = self.env.relfn2path(source)
+    if not os.path.isfile(filename):
+      filename = None
+    try:
+      found, files = routes.get_cache(self.env).routes(
+        source, filename, self.env.config.autorest_mode)
+    except Exception, e:
+      return [self.state.document.reporter.warning(
+        'can\'t read the routes of %r: %s' % (source, e), line=self.lineno)]
+    for filename in files:
+      self.env.note_dependency(filename)
+    methods = self.options.get('methods', '').upper().replace(',', ' ')
+    methods = set(methods.split())
+    prefix = self.options.get('prefix', '').rstrip('/')
+    sourcename = '<routes of %s>' % source
+    content = StringList()
+    for method, path, docstring in found:
+      if methods and method not in methods:
+        continue
+      for line in self.route_lines(method, prefix + path, docstring):
+        content.append(line, sourcename)
+    node = paragraph()
+    node.document = self.state.document
+    nested_parse_with_titles(self.state, content, node)
+    return node.children
+
+
+class HTTPOpenAPI(Directive):
+  """
+  Documents the operations of an OpenAPI or Swagger specification, given
+  as the path of a JSON or YAML file relative to the document, as
+  ``http:method`` entries.
+
+  Operations can be selected by tag, path prefix and method; only those
+  selected are expanded.
+  """
+  required_arguments = 1
+  option_spec = {
+    'tags': directives.unchanged,
+    'paths': directives.unchanged,
+    'methods': directives.unchanged,
+    }
+
+  def option_list(self, name, upper=False):
+    """Returns the comma or space separated values of an option."""
+    value = self.options.get(name, '').replace(',', ' ')
+    return (value.upper() if upper else value).split()
+
+  def run(self):
+    self.env = self.state.document.settings.env
+    source = self.arguments[0]
+    _, filename = self.env.relfn2path(source)
+    self.env.note_dependency(filename)
+    try:
+      spec = openapi.get_cache(self.env).spec(filename)
+      selected = spec.select(
+        [tag.strip() for tag in self.options.get('tags', '').split(',')
+         if tag.strip()],
+        self.option_list('paths'), self.option_list('methods', upper=True))
+      sourcename = '<openapi %s>' % source
+      content = StringList()
+      for path, method in selected:
+        for line in spec.operation_lines(path, method):
+          content.append(line, sourcename)
+    except Exception, e:
+      return [self.state.document.reporter.warning(
+        'can\'t read the operations of %r: %s' % (source, e),
+        line=self.lineno)]
+    node = paragraph()
+    node.document = self.state.document
+    nested_parse_with_titles(self.state, content, node)
+    return node.children
+
+
+class HTTPResponseMatrix(Directive):
+  """
+  Table of the documented endpoints against the status codes they respond
+  with, optionally restricted to the paths starting with one of the
+  ``prefix`` option.
+  """
+  option_spec = {
+    'prefix': directives.unchanged,
+    }
+
+  def run(self):
+    prefixes = self.options.get('prefix', '').replace(',', ' ').split()
+    return [http_responsematrix(prefixes=prefixes)]
@@ -0,0 +1,796 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Execution of curl examples.
+
+    Curl examples from autodoc docstrings and from ``http:example``
+    directives all go through the same ``ExampleExecutor``, which batches
+    and caches them.
+
+    The execution state of a build (tokens, backend, caches) is kept in an
+    ``ExecutionContext`` on its Sphinx application, so that several builds
+    can run in the same process.
+"""
+
+import cPickle as pickle
+import hashlib
+import itertools
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from sphinx_http_domain.auth import AuthenticationError, make_sessions
+from sphinx_http_domain.backends import (CurlBackend, CurlRequest,
+                                         make_backend, split_response)
+from sphinx_http_domain.cleanup import CleanupRegistry
+from sphinx_http_domain.directives import HTTPMethod
+from sphinx_http_domain.latency import LatencyHistory
+from sphinx_http_domain.normalize import ResponseNormalizer
+from sphinx_http_domain.streaming import split_events, stream_kind
+from sphinx_http_domain.utils import (parse_matrix, run_concurrently,
+                                      slugify_url)
+
+import pprint
+
+pp = pprint.PrettyPrinter(indent=4)
+
+_method_directive_re = re.compile(r'^\s*\.\.\s+http:method::(.*)$')
+_label_option_re = re.compile(r'^\s*:label-name:(.*)$')
+_matrix_re = re.compile(r'\s*Curl matrix:\s*(.*)$')
+
+
+def convert_curl_string_to_curl_command(curlString):
+  # remove line break chars and split into components
+  curl = curlString.replace('\\', '').split()
+  # the problem is that this will split apart legit words in the -d value,
+  # so we look for that block and squish them back together
+  startIndex = None
+  for i, subCmd in enumerate(curl):
+    if subCmd == '-d':
+      startIndex = i
+      break
+
+  endIndex = len(curl) - 1
+
+  subStrings = []
+  if startIndex:
+    for i in reversed(range(startIndex + 1, endIndex + 1)):
+      subStrings.append(curl.pop(i))
+    subStrings.reverse()
+    curl.insert(startIndex + 1, ' '.join(subStrings))
+
+  return curl
+
+
+def split_environments(tokens):
+  """
+  Returns the default tokens and the (name, tokens) environments of the
+  result of the ``rest-setup`` event, which is either a dict of tokens,
+  or a dict of named dicts of tokens, one per target environment.
+
+  Without environments, the latter is None.  Otherwise the default tokens
+  are those of the first environment.
+  """
+  if not tokens or not all(isinstance(value, dict)
+                           for value in tokens.itervalues()):
+    return tokens, None
+  names = list(tokens) if isinstance(tokens, OrderedDict) else sorted(tokens)
+  environments = [(name, tokens[name]) for name in names]
+  return environments[0][1], environments
+
+
+class ExecutionContext(object):
+  """
+  The execution state of the curl examples of one build: the tokens
+  returned by the ``rest-setup`` event, the backend, the response
+  normalizer, the latency history, the cleanup registry and the example
+  executor.
+
+  With several target *environments*, (name, tokens) pairs, every example
+  runs against each of them.
+
+  *auth* maps the environment names, None without environments, to the
+  :class:`~sphinx_http_domain.auth.AuthSession` shared by their examples;
+  *auth_header* is the header that carries its tokens.
+  """
+
+  def __init__(self, tokens=None, debug=False, normalizer=None,
+               backend=None, latency=None, cleanup=None,
+               environments=None, tabs=False, auth=None, auth_header=None):
+    self.tokens = tokens
+    self.environments = environments
+    self.auth = auth or {}
+    self.auth_header = auth_header
+    # whether divergent responses can be rendered with sphinx-tabs
+    self.tabs = tabs
+    self.debug = debug
+    self.normalizer = normalizer
+    self.backend = backend or CurlBackend()
+    self.latency = latency
+    self.cleanup = cleanup
+    self.executor = ExampleExecutor(self)
+
+  @classmethod
+  def from_app(cls, app):
+    """Returns the context of the build of *app*, set up from its config."""
+    filename = app.config.curl_latency_history
+    if filename is None:
+      filename = os.path.join(app.doctreedir, 'http-latency.json')
+    else:
+      filename = os.path.join(app.confdir, filename)
+    cleanup = CleanupRegistry(app.config.curl_cleanup_rules,
+                              app.config.curl_cleanup_workers,
+                              app.config.curl_cleanup_retries)
+    for command in app.config.curl_cleanup:
+      cleanup.register(command)
+    tokens, environments = split_environments(
+      app.emit_firstresult('rest-setup'))
+    auth = make_sessions(app, environments or [(None, tokens)],
+                         app.config.curl_auth_refresh)
+    context = cls(tokens=tokens,
+                  environments=environments,
+                  tabs='sphinx_tabs.tabs' in app._extensions,
+                  auth=auth,
+                  auth_header=app.config.curl_auth_header,
+                  debug=app.config.debug,
+                  normalizer=ResponseNormalizer.from_config(app.config),
+                  backend=make_backend(app.config),
+                  latency=LatencyHistory(filename,
+                                         app.config.curl_latency_window,
+                                         app.config.curl_latency_regression),
+                  cleanup=cleanup)
+    context.executor = ExampleExecutor(context,
+                                       os.path.join(app.doctreedir,
+                                                    'http-examples.pickle'),
+                                       app.config.curl_cache,
+                                       app.config.curl_batch_workers)
+    return context
+
+  def session(self, environment=None):
+    """
+    Returns the authenticated session of *environment*, or, if None, of
+    the first environment, like the default tokens.
+    """
+    if environment is None and self.environments:
+      environment = self.environments[0][0]
+    return self.auth.get(environment)
+
+  def environment_tokens(self, environment=None):
+    """
+    Returns the tokens of *environment*, or, if None, the default tokens.
+    """
+    if environment is None:
+      return self.tokens
+    return dict(self.environments)[environment]
+
+
+def get_context(app):
+  """Returns the execution context of the build of *app*, or None."""
+  return getattr(app, 'http_execution', None)
+
+
+class ExampleExecutor(object):
+  """
+  Runs curl examples in batches, and caches their responses.
+
+  Responses are keyed by the digest of the command after token
+  substitution, and persisted in *filename* between builds.  They are
+  always recorded, along with the method and URL of their request, but
+  only reused for requests executed with *cache*.
+  """
+
+  def __init__(self, context, filename=None, cache=False, workers=1):
+    self.context = context
+    self.filename = filename
+    self.cache = cache
+    self.workers = workers
+    self.responses = {}
+    self.lock = threading.Lock()
+    self.dirty = False
+    if filename and os.path.exists(filename):
+      try:
+        with open(filename, 'rb') as f:
+          self.responses = pickle.load(f)
+      except Exception:
+        # a stale or corrupt cache is simply rebuilt
+        self.responses = {}
+
+  def digest(self, request):
+    return hashlib.sha1('\0'.join(request).encode('utf-8')).hexdigest()
+
+  def execute(self, request, label=None, cache=None, timeout=None,
+              matrix=None):
+    """
+    Executes a parsed curl *request* and returns the lines rendering its
+    response, or its responses in each environment of the context.
+
+    With a *matrix*, (token, values) pairs, the request is executed for
+    each combination of the values of the tokens.
+    """
+    context = self.context
+    if matrix:
+      return self.execute_matrix(request, matrix, label, cache, timeout)
+    if not context.environments:
+      return translate_response(context,
+                                self.fetch(request, label, cache, timeout))
+
+    def fetch(environment):
+      name, tokens = environment
+      return name, self.fetch(list(request), label, cache, timeout, tokens,
+                              name)
+
+    # all at once, so that an example takes as long as its slowest
+    # environment
+    results = run_concurrently(fetch, context.environments,
+                               len(context.environments))
+    for result in results:
+      if isinstance(result, Exception):
+        raise result
+    return translate_responses(context, results)
+
+  def execute_matrix(self, request, matrix, label=None, cache=None,
+                     timeout=None):
+    """
+    Executes a parsed curl *request* for each combination of the token
+    values of *matrix*, in each environment, as a single batch.
+    """
+    context = self.context
+    names = [token for token, _ in matrix]
+    combinations = [zip(names, values) for values in
+                    itertools.product(*[values for _, values in matrix])]
+    environments = context.environments or [(None, context.tokens)]
+    jobs = [(combination, name, tokens) for combination in combinations
+            for name, tokens in environments]
+
+    def fetch(job):
+      combination, name, tokens = job
+      tokens = dict(tokens or {})
+      tokens.update(combination)
+      return name, self.fetch(list(request), label, cache, timeout, tokens,
+                              name)
+
+    # as many at once as the batch workers, or the environments of an
+    # example without a matrix
+    results = run_concurrently(fetch, jobs,
+                               max(self.workers, len(environments)))
+    for result in results:
+      if isinstance(result, Exception):
+        raise result
+    rendered = []
+    for i, combination in enumerate(combinations):
+      responses = results[i * len(environments):(i + 1) * len(environments)]
+      if context.environments:
+        lines = translate_responses(context, responses)
+      else:
+        lines = translate_response(context, responses[0][1])
+      rendered.append((combination, lines))
+    return translate_matrix(context, names, rendered)
+
+  def fetch(self, request, label=None, cache=None, timeout=None,
+            tokens=None, environment=None):
+    """
+    Executes a parsed curl *request* with *tokens*, those of the context by
+    default, and the session of *environment*, and returns its response.
+    """
+    context = self.context
+    if cache is None:
+      cache = self.cache
+    prepare_curl_request(context, request, tokens)
+    # keyed before the session tokens, which change when they are refreshed
+    key = self.digest(request)
+    response = self.responses.get(key) if cache else None
+    if response is not None:
+      return response
+    try:
+      response = self.send(request, timeout, tokens, environment)
+    except Exception as e:
+      raise Exception("Error executing curl during API doc build.\n\t" +
+                      "Curl call details are: " + ' '.join(request) + '\n\t' +
+                      "Errors from API: " + str(e))
+    if context.latency is not None and label is not None:
+      context.latency.record(label, response['elapsed'], response['size'])
+    if context.cleanup is not None:
+      context.cleanup.register_response(request, response, environment)
+    try:
+      req = CurlRequest.from_command(request)
+      response['request'] = (req.method, req.url)
+    except ValueError:
+      pass
+    response['recorded'] = time.time()
+    with self.lock:
+      self.responses[key] = response
+      self.dirty = True
+    return response
+
+  def send(self, request, timeout=None, tokens=None, environment=None):
+    """
+    Sends a prepared curl *request* with the session of *environment*, if
+    any, authenticating again once if its tokens are refused.
+    """
+    context = self.context
+    authenticated = list(request)
+    auth = apply_auth(context, authenticated, environment)
+    if auth is None:
+      return send_curl_request(context, authenticated, timeout, tokens)
+    try:
+      return send_curl_request(context, authenticated, timeout, tokens, auth,
+                               reauthenticate=True)
+    except AuthenticationError:
+      # revoked, or expired early: examples documenting a 401 response
+      # get it on the second attempt
+      context.session(environment).invalidate(auth)
+      authenticated = list(request)
+      auth = apply_auth(context, authenticated, environment)
+      return send_curl_request(context, authenticated, timeout, tokens, auth)
+
+  def run(self, requests):
+    """
+    Executes a batch of (request, label, options) tuples, where *options*
+    are keyword arguments of :meth:`execute`, on ``workers`` threads.
+
+    Returns the rendered lines of each request, in order.
+    """
+    def execute(item):
+      request, label, options = item
+      return self.execute(request, label, **options)
+
+    results = run_concurrently(execute, requests, self.workers)
+    for result in results:
+      if isinstance(result, Exception):
+        raise result
+    return results
+
+  def save(self):
+    if not self.filename or not self.dirty:
+      return
+    with open(self.filename, 'wb') as f:
+      pickle.dump(self.responses, f, pickle.HIGHEST_PROTOCOL)
+    self.dirty = False
+
+
+def find_curl_requests(doclines):
+  """
+  Returns a list of (insertion index, curl string) tuples, one for each
+  'Curl request' block in *doclines*.
+  """
+  startIndex = None
+  endIndex = None
+  requests = []
+
+  for i, line in enumerate(doclines):
+    if 'Curl request' in line:
+      if startIndex is not None:
+        # this means we have a start index, and ran into another 'Curl request'
+        # so we need to process the proceeding one before moving along
+        requests.append((i - 3, ' '.join(doclines[startIndex + 1:i - 2])))
+      startIndex = i
+    else:
+      endIndex = i
+
+  if startIndex is not None:
+    requests.append((len(doclines) - 1,
+                     ' '.join(doclines[startIndex + 1:endIndex])))
+
+  return requests
+
+
+def find_method_label(doclines, index):
+  """
+  Returns the label of the last ``http:method`` directive declared before
+  line *index* of *doclines*, or None.
+  """
+  for i in reversed(range(index)):
+    m = _method_directive_re.match(doclines[i])
+    if m is None:
+      continue
+    for option in doclines[i + 1:index]:
+      o = _label_option_re.match(option)
+      if o is not None:
+        return o.group(1).strip()
+      if not option.strip().startswith(':'):
+        break
+    sig = HTTPMethod.sig_re.match(m.group(1).strip())
+    if sig is None:
+      return None
+    method, url = sig.groups()
+    return slugify_url((method or 'GET').lower() + '-' + url)
+  return None
+
+
+def split_matrix(curl):
+  """
+  Returns the curl string *curl* without its ``Curl matrix:`` line, and
+  the parsed matrix, or None.
+  """
+  m = _matrix_re.search(curl)
+  if m is None:
+    return curl, None
+  return curl[:m.start()], parse_matrix(m.group(1))
+
+
+def matrix_curls(curl, matrix):
+  """Returns *curl* with the values of each combination of *matrix*."""
+  if not matrix:
+    return [curl]
+  curls = []
+  for values in itertools.product(*[values for _, values in matrix]):
+    expanded = curl
+    for (token, _), value in zip(matrix, values):
+      expanded = expanded.replace(token, value)
+    curls.append(expanded)
+  return curls
+
+
+def extract_curl_requests(context, doclines, name=None):
+  found = find_curl_requests(doclines)
+  requests = []
+  for n, (index, curl) in enumerate(found):
+    curl, matrix = split_matrix(curl)
+    # examples outside of a method are measured under their recorded key
+    label = find_method_label(doclines, index) or '%s#%d' % (name, n)
+    requests.append((convert_curl_string_to_curl_command(curl), label,
+                     {'matrix': matrix}))
+  responses = context.executor.run(requests)
+  additions = [(index, newLines)
+               for (index, _), newLines in zip(found, responses)]
+
+  currentInjectionHeight = 0
+
+  for addition in additions:
+    # inject the response addition in the right place, based on the index in
+    # the tuple
+    insertionIndex = addition[0] + currentInjectionHeight
+    insertionLines = addition[1]
+    doclines[insertionIndex:insertionIndex] = insertionLines
+    currentInjectionHeight += len(insertionLines)
+
+
+def record_curl_requests(env, name, doclines):
+  """
+  Records the curl examples of the autodoc object *name* in the domain data,
+  so builders can replay them without rendering the docs.
+  """
+  data = env.domaindata['http']['curl']
+  for n, (index, curl) in enumerate(find_curl_requests(doclines)):
+    label = find_method_label(doclines, index)
+    curl, matrix = split_matrix(curl)
+    curls = matrix_curls(curl, matrix)
+    if len(curls) == 1:
+      data['%s#%d' % (name, n)] = (env.docname, label, curl)
+      continue
+    for m, curl in enumerate(curls):
+      data['%s#%d.%d' % (name, n, m)] = (env.docname, label, curl)
+
+
+def make_command_substitutions(cmd, tokens):
+  for i, item in enumerate(cmd):
+    for token in tokens or ():
+      value = tokens[token]
+      if token in item:
+        cmd[i] = cmd[i].replace(token, value)
+
+
+
+def escape_double_quotes_in_curl_data(curlRequest):
+  for i, v in enumerate(curlRequest):
+    if v == '-d':
+      curlRequest[i + 1] = curlRequest[i + 1][1:-1]
+      break
+
+
+def prepare_curl_request(context, request, tokens=None):
+  """
+  Substitutes *tokens*, those of the context by default, and unquotes data
+  in a parsed curl *request*.
+  """
+  if context.debug:
+    print '\nexecuting curl request:'
+    pp.pprint(request)
+  if tokens is None:
+    tokens = context.tokens
+  make_command_substitutions(request, tokens)
+  escape_double_quotes_in_curl_data(request)
+  if context.debug:
+    print 'Processed request: '
+    pp.pprint(request)
+
+
+def apply_auth(context, request, environment=None):
+  """
+  Substitutes the tokens of the session of *environment*, by default of
+  the first environment, in a prepared curl *request*, and adds the
+  ``curl_auth_header`` carrying them.
+
+  Returns the tokens, or None if the environment has no session.
+  """
+  session = context.session(environment)
+  tokens = session.tokens() if session is not None else None
+  if tokens is None:
+    return None
+  make_command_substitutions(request, tokens)
+  if context.auth_header:
+    header = [context.auth_header]
+    make_command_substitutions(header, tokens)
+    request[1:1] = ['-H', header[0]]
+  return tokens
+
+
+def send_curl_request(context, request, timeout=None, tokens=None, auth=None,
+                      reauthenticate=False):
+  """
+  Sends a prepared curl *request*, authenticated with the session tokens
+  *auth*, if any, which are masked in the response.  With
+  *reauthenticate*, a ``401`` response raises an ``AuthenticationError``.
+  """
+  backend = context.backend
+  if tokens is None:
+    tokens = context.tokens
+  result = None
+  body = None
+  # add the -i option to print the response headers as well
+  request.append('-i')
+  if timeout:
+    request.extend(['--max-time', str(timeout)])
+  # the session tokens are kept out of the build log
+  shown = ' '.join(request)
+  for token, value in (auth or {}).iteritems():
+    if value:
+      shown = shown.replace(value, token)
+  print '\n' + shown
+  start = time.time()
+  raw = backend.execute(request)
+  elapsed = time.time() - start
+  print '\tresponse received'
+  status, headers, rawBody = split_response(raw)
+
+  if context.debug:
+    pp.pprint((headers, rawBody))
+
+  # curl failed, or timed out, before a response came back
+  if status is None:
+    raise Exception(headers.split('\r\n')[0] or 'no response')
+
+  if reauthenticate and status == 401:
+    raise AuthenticationError(headers.split('\r\n')[0])
+
+  result = { 'headers': headers, 'elapsed': elapsed, 'size': len(rawBody) }
+  # Replace the API_KEY given back with the response with a dummy value
+  if rawBody:
+    for token, value in (auth or {}).iteritems():
+      if value:
+        rawBody = rawBody.replace(value, token.strip('{}'))
+    api_key = (tokens or {}).get('{API_KEY}')
+    if api_key:
+      rawBody = rawBody.replace(api_key, 'API_KEY')
+  kind = stream_kind(headers)
+  if kind is not None:
+    # the events captured from a streaming response, within the limits of
+    # the backend
+    result['stream'] = kind
+    result['events'] = split_events(kind, rawBody)
+  elif rawBody:
+    result['body'] = json.loads(rawBody)
+
+    body = result['body']
+    if 'errors' in body:
+      raise Exception("Error executing curl during API doc build.\n\t" +
+                      "Curl call details are: " + shown + '\n\t' +
+                      "Errors from API: " + str(body['errors']))
+
+  return result
+
+
+def translate_response(context, response, title='Curl response'):
+  normalizer = context.normalizer
+  sort_keys = False
+  if normalizer is not None:
+    response = normalizer.normalize(response)
+    sort_keys = normalizer.sort_keys
+  headers = response['headers']
+  newResponse = None
+  if 'body' in response:
+    body = response['body']
+    newResponse = json.dumps(body, ensure_ascii=False, indent=2,
+                             sort_keys=sort_keys).split('\n')
+
+  newLines = []
+  # add the header lines before the code
+  newLines.append('')
+  newLines.append('  %s:' % title)
+  newLines.append('')
+  newLines.append('  .. code-block:: http')
+  newLines.append('')
+  for hdr in headers.split('\n'):
+    newLines.append('    ' + hdr)
+
+  if newResponse is not None:
+    newLines.append('')
+    newLines.append('  .. code-block:: json')
+    newLines.append('')
+    # add 4 spaces to each response line to properly indent it within code-block
+    for i, line in enumerate(newResponse):
+      newResponse[i] = '    ' + line
+    # extra buffer line between sections
+    newResponse.append('')
+    # add response to end of doclines
+    newLines.extend(newResponse)
+
+  if 'events' in response:
+    newLines.extend(translate_events(response, sort_keys))
+
+  if normalizer is not None:
+    newLines = [normalizer.scrub_line(line) for line in newLines]
+
+  return newLines
+
+
+def translate_events(response, sort_keys=False):
+  """
+  Returns the lines rendering the events of a streaming response, one
+  line per NDJSON document, or the server-sent events as they were sent.
+  """
+  lines = ['']
+  if response['stream'] == 'ndjson':
+    lines.extend(['  .. code-block:: javascript', ''])
+    for event in response['events']:
+      lines.append('    ' + json.dumps(event, ensure_ascii=False,
+                                        sort_keys=sort_keys))
+  else:
+    lines.extend(['  .. code-block:: text', ''])
+    for event in response['events']:
+      lines.extend('    ' + line for line in event.split('\n'))
+      lines.append('')
+  lines.append('')
+  return lines
+
+
+def translate_responses(context, responses):
+  """
+  Returns the lines rendering the responses of an example in several
+  environments, given as (name, response) pairs.  Identical responses are
+  rendered once; divergent ones as tabs, with sphinx-tabs, or else one
+  after the other.
+  """
+  groups = []
+  for name, response in responses:
+    lines = translate_response(context, response)
+    for names, other in groups:
+      if other == lines:
+        names.append(name)
+        break
+    else:
+      groups.append(([name], lines))
+  if len(groups) == 1 or not context.tabs:
+    newLines = []
+    for names, lines in groups:
+      newLines.append('')
+      newLines.append('  Curl response (%s):' % ', '.join(names))
+      newLines.extend(lines[2:])
+    return newLines
+  newLines = ['', '  Curl response:', '', '  .. tabs::']
+  for names, lines in groups:
+    newLines.append('')
+    newLines.append('     .. tab:: %s' % ', '.join(names))
+    # the code blocks, indented into the tab
+    newLines.extend('      ' + line if line else '' for line in lines[2:])
+  newLines.append('')
+  return newLines
+
+
+def response_body(lines):
+  """
+  Returns the rendered response *lines* without their leading blank line
+  and untitled ``Curl response:`` heading, and dedented.
+  """
+  lines = list(lines)
+  while lines and not lines[0]:
+    lines.pop(0)
+  if lines and lines[0] == '  Curl response:':
+    lines.pop(0)
+    while lines and not lines[0]:
+      lines.pop(0)
+  return [line[2:] for line in lines]
+
+
+def translate_matrix(context, names, rendered):
+  """
+  Returns the lines rendering the responses of an example for each
+  combination of the token values of a matrix, given as (combination,
+  lines) pairs: as tabs with sphinx-tabs, or else as a table.
+  """
+  if context.tabs:
+    newLines = ['', '  Curl responses:', '', '  .. tabs::']
+    for combination, lines in rendered:
+      newLines.append('')
+      newLines.append('     .. tab:: %s' % ', '.join(
+        '%s=%s' % (token.strip('{}'), value) for token, value in combination))
+      newLines.append('')
+      newLines.extend('        ' + line if line else ''
+                      for line in response_body(lines))
+    newLines.append('')
+    return newLines
+  newLines = ['', '  Curl responses:', '', '  .. list-table::',
+              '     :header-rows: 1', '']
+  header = [token.strip('{}') for token in names] + ['Response']
+  for i, cell in enumerate(header):
+    newLines.append('     %s - %s' % ('*' if i == 0 else ' ', cell))
+  for combination, lines in rendered:
+    cells = [[value] for _, value in combination] + [response_body(lines)]
+    for i, cell in enumerate(cells):
+      newLines.append('     %s - %s' % ('*' if i == 0 else ' ', cell[0]))
+      newLines.extend('         ' + line if line else ''
+                      for line in cell[1:])
+  newLines.append('')
+  return newLines
+
+
+def replace_curl_examples(app, what, name, obj, options, lines):
+  if what != 'rest':
+    return
+  record_curl_requests(app.env, name, lines)
+  if not app.config.auto_curl or getattr(app.builder, 'replays_examples', False):
+    return
+  extract_curl_requests(get_context(app), lines, name)
+
+
+def emit_rest_setup(app):
+  """Sets up the execution context of the build of *app*."""
+  app.http_execution = ExecutionContext.from_app(app)
+  return app.http_execution
+
+
+def check_latencies(app, exception):
+  context = get_context(app)
+  if context is None or context.latency is None or exception is not None:
+    return
+  latency = context.latency
+  budgets = {}
+  for label, entry in app.env.domaindata['http']['method'].iteritems():
+    if entry[4] is not None:
+      budgets[label] = entry[4]
+  latency.check(budgets, app.warn)
+  latency.save()
+
+
+def save_examples(app, exception):
+  context = get_context(app)
+  if context is not None:
+    context.executor.save()
+
+def execute_cleanup_command(context, curl, environment=None):
+  """
+  Executes a cleanup curl command in *environment*, raising if it did not
+  succeed.
+  """
+  request = convert_curl_string_to_curl_command(curl)
+  prepare_curl_request(context, request,
+                       context.environment_tokens(environment))
+  apply_auth(context, request, environment)
+  request.append('-i')
+  status, headers, body = split_response(context.backend.execute(request))
+  # a resource that is already gone does not need cleaning up
+  if status is None or (status >= 400 and status != 404):
+    raise Exception(headers.split('\r\n')[0] or 'no response')
+
+
+def teardown(app, exception):
+  context = get_context(app)
+  if context is None or context.cleanup is None:
+    return
+  cleanup = context.cleanup
+  app.emit('rest-cleanup', cleanup)
+  if not cleanup.commands:
+    return
+  app.info('removing %d resources created by examples...' %
+           len(cleanup.commands))
+  for command, environment, error in cleanup.run(
+      lambda curl, environment: execute_cleanup_command(context, curl,
+                                                        environment)):
+    if environment is not None:
+      command = '%s in %s' % (command, environment)
+    app.warn('could not clean up after examples: %s (%s)' % (command, error))
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Routes of the HTTP methods, and the routing table index of the HTTP
+    domain.
+"""
+
+import re
+from urlparse import urlsplit
+
+from sphinx.locale import l_, _
+from sphinx.domains import Index
+
+from sphinx_http_domain.directives import HTTPMethod
+from sphinx_http_domain.utils import slugify_url
+
+_arg_re = re.compile(r'\{[^}]*\}')
+
+
+def route_path(sig):
+  """
+  Returns the (method, path) of an ``http:method`` signature, or None.
+  """
+  m = HTTPMethod.sig_re.match(sig)
+  if m is None:
+    return None
+  method, url = m.groups()
+  return (method or 'GET').upper(), urlsplit(url.strip()).path or '/'
+
+
+def route_key(sig):
+  """
+  Returns a key identifying the route of an ``http:method`` signature
+  whatever its arguments are named, such as ``GET /api/models/{}``, or
+  None if *sig* is not a route.
+  """
+  route = route_path(sig)
+  if route is None or not route[1].startswith('/'):
+    return None
+  method, path = route
+  return '%s %s' % (method, _arg_re.sub('{}', path.rstrip('/') or '/'))
+
+
+def path_prefix(path, depth):
+  """Returns the first *depth* segments of *path*."""
+  return '/'.join(path.split('/')[:depth + 1]) or '/'
+
+
+class HTTPRoutingIndex(Index):
+  """
+  Index of the HTTP methods, grouped by path prefix, then by path.
+
+  The routes under the path prefixes in ``exclude`` are left out; they
+  are listed in indices of their own, made by :func:`make_routing_index`.
+  """
+  name = 'routingtable'
+  localname = l_('HTTP Routing Table')
+  shortname = l_('routing table')
+  prefix = None
+  exclude = ()
+
+  def includes(self, path):
+    if self.prefix is not None and not path.startswith(self.prefix):
+      return False
+    return not any(path.startswith(prefix) for prefix in self.exclude)
+
+  def generate(self, docnames=None):
+    depth = self.domain.env.config.http_index_prefix_depth
+    routes = {}
+    for name, entry in self.domain.data['method'].iteritems():
+      docname, sig, title = entry[:3]
+      if docnames is not None and docname not in docnames:
+        continue
+      route = route_path(sig)
+      if route is None or not self.includes(route[1]):
+        continue
+      method, path = route
+      descr = title if title != sig else ''
+      routes.setdefault(path, []).append(
+        (method, docname, 'method-' + name, descr))
+
+    content = {}
+    for path in sorted(routes):
+      entries = content.setdefault(path_prefix(path, depth), [])
+      methods = sorted(routes[path])
+      if len(methods) == 1:
+        method, docname, anchor, descr = methods[0]
+        entries.append([path, 0, docname, anchor, method, '', descr])
+        continue
+      # one sub-entry per method of a path
+      entries.append([path, 1, '', '', '', '', ''])
+      for method, docname, anchor, descr in methods:
+        entries.append([method, 2, docname, anchor, '', '', descr])
+    return sorted(content.items()), False
+
+
+def make_routing_index(prefix):
+  """Returns an index class listing the routes under *prefix* only."""
+  slug = slugify_url(prefix).strip('-')
+  return type('HTTPRoutingIndex_' + str(slug.replace('-', '_')),
+              (HTTPRoutingIndex,),
+              {'name': 'routingtable-' + slug,
+               'localname': _('HTTP Routing Table: %s') % prefix,
+               'shortname': _('routing table: %s') % prefix,
+               'prefix': prefix})
+
+
+def make_routing_indices(split):
+  """
+  Returns the routing table index classes, with one separate index for
+  each path prefix in *split*.
+  """
+  main = type('HTTPRoutingIndex', (HTTPRoutingIndex,),
+              {'exclude': tuple(split)})
+  return [main] + [make_routing_index(prefix) for prefix in split]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Resolution of HTTP cross-references to other projects, through the
+    inventories loaded by ``sphinx.ext.intersphinx``.
+"""
+
+from os import path
+
+from docutils.nodes import reference
+from docutils.utils import relative_path
+
+from sphinx.locale import _
+
+from sphinx_http_domain.indices import route_key
+
+
+class InventoryTable(object):
+  """
+  Lookup table of the HTTP entries of intersphinx inventories.
+
+  Entries are found by (inventory name, type, name), and methods also by
+  the key of their route, so ``GET /api/models/{id}`` finds a method
+  documented as ``GET /api/models/{model_id}``.  The inventory name is
+  None for the unnamed inventory holding the entries of all projects.
+  """
+
+  def __init__(self, inventory, named_inventory):
+    self.entries = {}
+    self.routes = {}
+    self.add(None, inventory)
+    for setname, inventory in sorted(named_inventory.iteritems()):
+      self.add(setname, inventory)
+
+  def add(self, setname, inventory):
+    for objtype, entries in inventory.iteritems():
+      domain, _, typ = objtype.partition(':')
+      if domain != 'http':
+        continue
+      for name, entry in entries.iteritems():
+        self.entries.setdefault((setname, typ, name), entry)
+        if typ == 'method' and entry[3] != '-':
+          key = route_key(entry[3])
+          if key is not None:
+            self.routes.setdefault((setname, key), entry)
+
+  def lookup(self, typ, target, setnames=()):
+    """
+    Returns the (project, version, uri, dispname) of *target*, or None.
+
+    A target prefixed with the name of an inventory in *setnames*, such
+    as ``billing:get-invoice``, is only looked up in that inventory.
+    """
+    setname = None
+    if ':' in target:
+      prefix, name = target.split(':', 1)
+      if prefix in setnames:
+        setname, target = prefix, name
+    entry = self.entries.get((setname, typ, target))
+    if entry is None and typ == 'method':
+      key = route_key(target)
+      if key is not None:
+        entry = self.routes.get((setname, key))
+    return entry
+
+
+def missing_reference(app, env, node, contnode):
+  """Resolves an HTTP cross-reference to another project."""
+  if node.get('refdomain') != 'http':
+    return None
+  inventory = getattr(env, 'intersphinx_inventory', None)
+  if not inventory:
+    return None
+  named_inventory = getattr(env, 'intersphinx_named_inventory', {})
+  table = env.get_domain('http').inventory_table(inventory, named_inventory)
+  entry = table.lookup(node['reftype'], node['reftarget'], named_inventory)
+  if entry is None:
+    return None
+  project, version, uri, dispname = entry
+  if '://' not in uri and node.get('refdoc'):
+    # get correct path in case of subdirectories
+    uri = path.join(relative_path(node['refdoc'], env.srcdir), uri)
+  newnode = reference('', '', internal=False, refuri=uri,
+                      reftitle=_('(in %s v%s)') % (project, version))
+  if node.get('refexplicit') or dispname == '-':
+    newnode.append(contnode)
+  else:
+    newnode.append(contnode.__class__(dispname, dispname))
+  return newnode
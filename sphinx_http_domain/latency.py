@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Latency history of executed curl examples.
+"""
+
+import json
+import os
+import time
+
+
+class LatencyHistory(object):
+  """
+  Persistent record of the latency and response size of each executed
+  example, keyed by the label of its ``http:method``.
+
+  The history file maps labels to their last *window* samples, so that a
+  build can be compared with the rolling baseline of previous builds.
+  """
+
+  def __init__(self, filename, window=10, regression=None):
+    self.filename = filename
+    self.window = int(window)
+    self.regression = None if regression is None else float(regression)
+    self.history = {}
+    self.current = {}
+    if os.path.exists(filename):
+      with open(filename) as f:
+        self.history = json.load(f)
+
+  def record(self, label, latency, size):
+    self.current.setdefault(label, []).append(
+      {'latency': latency, 'size': size, 'time': time.time()}
+    )
+
+  def baseline(self, label):
+    """Returns the mean latency of *label* over previous builds, or None."""
+    samples = self.history.get(label)
+    if not samples:
+      return None
+    return sum(s['latency'] for s in samples) / len(samples)
+
+  def check(self, budgets, warn):
+    """
+    Calls *warn* for every label measured in this build whose mean latency
+    exceeds its budget (from *budgets*, in seconds), or the rolling
+    baseline by more than ``regression`` percent.
+    """
+    for label, samples in sorted(self.current.items()):
+      latency = sum(s['latency'] for s in samples) / len(samples)
+      budget = budgets.get(label)
+      if budget is not None and latency > budget:
+        warn('%s: latency %.3gms exceeds its budget of %.3gms' %
+             (label, latency * 1000, budget * 1000))
+      baseline = self.baseline(label)
+      if self.regression is not None and baseline:
+        increase = (latency - baseline) / baseline * 100
+        if increase > self.regression:
+          warn('%s: latency %.3gms is %.0f%% over its baseline of %.3gms' %
+               (label, latency * 1000, increase, baseline * 1000))
+
+  def save(self):
+    if not self.current:
+      return
+    for label, samples in self.current.items():
+      history = self.history.get(label, []) + samples
+      self.history[label] = history[-self.window:]
+    self.current = {}
+    dirname = os.path.dirname(self.filename)
+    if dirname and not os.path.isdir(dirname):
+      os.makedirs(dirname)
+    with open(self.filename, 'w') as f:
+      json.dump(self.history, f, indent=2, sort_keys=True)
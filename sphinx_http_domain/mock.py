@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Mock API server built from the documented HTTP methods and the example
+    responses recorded while building the documentation.
+
+    Run it against the doctree directory of a build::
+
+        python -m sphinx_http_domain.mock docs/_build/doctrees -p 8080
+
+    Every ``http:method`` becomes a route; it answers with the last recorded
+    response of an example whose request matches it.  The events captured
+    from a streaming response are served at once, as its body.  Responses
+    are rendered once, at startup, and served from memory by a
+    single-threaded asynchronous server.
+"""
+
+import asynchat
+import asyncore
+import cPickle as pickle
+import json
+import optparse
+import os
+import re
+import socket
+import sys
+from urlparse import urlsplit
+
+from sphinx_http_domain.directives import HTTPMethod
+from sphinx_http_domain.docfields import ResponseField
+
+
+# headers of recorded responses that no longer apply when served
+_skipped_headers = ('content-length', 'connection', 'transfer-encoding',
+                    'keep-alive', 'date', 'server')
+
+
+def route_pattern(path):
+  """
+  Returns a regular expression source matching *path*, where each
+  ``{arg}`` matches one path segment.
+  """
+  pattern = []
+  for text, arg in HTTPMethod.path_re.findall(path)[:-1]:
+    pattern.append(re.escape(text))
+    if arg:
+      pattern.append('[^/]+')
+  return ''.join(pattern)
+
+
+class CannedResponse(object):
+  """A response rendered once, and served as is."""
+
+  def __init__(self, status, headers, body):
+    lines = ['HTTP/1.1 %s' % status]
+    lines.extend('%s: %s' % header for header in headers)
+    lines.append('Content-Length: %d' % len(body))
+    self.head = '\r\n'.join(lines) + '\r\n'
+    self.body = body
+
+  @classmethod
+  def from_status(cls, code):
+    reason = ResponseField.status_codes.get(str(code), '')
+    body = json.dumps({'status': code, 'message': reason})
+    return cls('%d %s' % (code, reason),
+               [('Content-Type', 'application/json')], body)
+
+  @classmethod
+  def from_recorded(cls, response):
+    """Builds a response from one recorded by the example executor."""
+    lines = response['headers'].replace('\r', '').split('\n')
+    status = lines[0].split(None, 1)[1] if ' ' in lines[0] else '200 OK'
+    headers = []
+    for line in lines[1:]:
+      name, _, value = line.partition(':')
+      if name.strip() and name.strip().lower() not in _skipped_headers:
+        headers.append((name.strip(), value.strip()))
+    body = ''
+    if 'body' in response:
+      body = json.dumps(response['body'], ensure_ascii=False)
+    elif response.get('stream') == 'ndjson':
+      body = ''.join(json.dumps(event, ensure_ascii=False) + '\n'
+                     for event in response['events'])
+    elif 'events' in response:
+      body = ''.join(event + '\n\n' for event in response['events'])
+    if isinstance(body, unicode):
+      body = body.encode('utf-8')
+    return cls(status, headers, body)
+
+  def render(self, keep_alive):
+    connection = 'keep-alive' if keep_alive else 'close'
+    return self.head + 'Connection: ' + connection + '\r\n\r\n' + self.body
+
+
+class RouteTable(object):
+  """
+  Maps a method and a path to a canned response.
+
+  Paths without arguments are looked up in a dict.  The others are matched
+  by compiled regular expressions in which each route is an alternative;
+  the index of the group that matched identifies the route.  Each method
+  has as few of them as the limit on the groups of a regular expression
+  allows.
+  """
+
+  # Python 2 regular expressions have at most 100 groups
+  chunk_size = 99
+
+  def __init__(self):
+    self.static = {}
+    self.templated = {}
+    self.patterns = {}
+    self.not_found = CannedResponse.from_status(404)
+    self.not_allowed = CannedResponse.from_status(405)
+
+  def add(self, method, path, response):
+    if '{' not in path:
+      self.static.setdefault((method, path), response)
+    else:
+      self.templated.setdefault(method, []).append(
+        (route_pattern(path), response))
+
+  def compile(self):
+    for method, routes in self.templated.items():
+      # more specific routes (with more literal text) take precedence
+      routes.sort(key=lambda route: -len(re.sub(r'\[\^/\]\+', '', route[0])))
+      self.patterns[method] = []
+      for i in xrange(0, len(routes), self.chunk_size):
+        chunk = routes[i:i + self.chunk_size]
+        regex = re.compile('^(?:%s)$' % '|'.join('(%s)' % pattern
+                                                 for pattern, _ in chunk))
+        self.patterns[method].append(
+          (regex, [response for _, response in chunk]))
+
+  def match(self, method, path):
+    response = self.static.get((method, path))
+    if response is not None:
+      return response
+    for regex, responses in self.patterns.get(method, ()):
+      m = regex.match(path)
+      if m is not None:
+        return responses[m.lastindex - 1]
+    return None
+
+  def respond(self, method, path):
+    response = self.match(method, path)
+    if response is not None:
+      return response
+    methods = set(m for m, _ in self.static) | set(self.patterns)
+    for other in methods - set([method]):
+      if self.match(other, path) is not None:
+        return self.not_allowed
+    return self.not_found
+
+  @classmethod
+  def from_build(cls, domaindata, responses):
+    """
+    Builds the route table from the HTTP domain data and the responses
+    recorded by the example executor.
+    """
+    table = cls()
+    recorded = {}
+    for response in responses.itervalues():
+      if 'request' in response:
+        method, url = response['request']
+        recorded.setdefault(method, []).append((urlsplit(url).path, response))
+    for candidates in recorded.itervalues():
+      # the last recorded response first
+      candidates.sort(key=lambda (path, response):
+                      (-response.get('recorded', 0), path))
+    not_implemented = CannedResponse.from_status(501)
+    for name, entry in sorted(domaindata['method'].items()):
+      m = HTTPMethod.sig_re.match(entry[1])
+      if m is None:
+        continue
+      method = (m.group(1) or 'GET').upper()
+      path = urlsplit(m.group(2).strip()).path
+      regex = re.compile('^%s$' % route_pattern(path))
+      response = not_implemented
+      for recorded_path, candidate in recorded.get(method, ()):
+        if regex.match(recorded_path):
+          response = CannedResponse.from_recorded(candidate)
+          break
+      table.add(method, path, response)
+    table.compile()
+    return table
+
+
+class MockChannel(asynchat.async_chat):
+  """One client connection, which may carry several requests."""
+
+  def __init__(self, sock, routes):
+    asynchat.async_chat.__init__(self, sock)
+    self.routes = routes
+    self.buffer = []
+    self.reading_body = False
+    self.set_terminator('\r\n\r\n')
+
+  def collect_incoming_data(self, data):
+    if not self.reading_body:
+      self.buffer.append(data)
+
+  def found_terminator(self):
+    if self.reading_body:
+      # request bodies are read and ignored
+      self.reading_body = False
+      self.set_terminator('\r\n\r\n')
+      return
+    head = ''.join(self.buffer)
+    self.buffer = []
+    lines = head.split('\r\n')
+    try:
+      method, target, version = lines[0].split()
+    except ValueError:
+      self.push(CannedResponse.from_status(400).render(False))
+      self.close_when_done()
+      return
+    headers = {}
+    for line in lines[1:]:
+      name, _, value = line.partition(':')
+      headers[name.strip().lower()] = value.strip()
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+      keep_alive = connection == 'keep-alive'
+    else:
+      keep_alive = connection != 'close'
+    path = target.split('?', 1)[0].split('#', 1)[0]
+    response = self.routes.respond(method.upper(), path)
+    self.push(response.render(keep_alive))
+    if not keep_alive:
+      self.close_when_done()
+      return
+    length = int(headers.get('content-length') or 0)
+    if length:
+      self.reading_body = True
+      self.set_terminator(length)
+
+
+class MockServer(asyncore.dispatcher):
+
+  def __init__(self, routes, host='127.0.0.1', port=8080):
+    asyncore.dispatcher.__init__(self)
+    self.routes = routes
+    self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.set_reuse_addr()
+    self.bind((host, port))
+    self.listen(1024)
+
+  def handle_accept(self):
+    pair = self.accept()
+    if pair is not None:
+      MockChannel(pair[0], self.routes)
+
+
+def load_build(doctreedir):
+  """
+  Returns the HTTP domain data and the recorded example responses of the
+  build whose doctrees are in *doctreedir*.
+  """
+  with open(os.path.join(doctreedir, 'environment.pickle'), 'rb') as f:
+    env = pickle.load(f)
+  responses = {}
+  filename = os.path.join(doctreedir, 'http-examples.pickle')
+  if os.path.exists(filename):
+    with open(filename, 'rb') as f:
+      responses = pickle.load(f)
+  return env.domaindata['http'], responses
+
+
+def main(argv=sys.argv):
+  parser = optparse.OptionParser(usage='%prog [options] DOCTREEDIR')
+  parser.add_option('-H', dest='host', default='127.0.0.1',
+                    help='address to listen on (default: 127.0.0.1)')
+  parser.add_option('-p', dest='port', type='int', default=8080,
+                    help='port to listen on (default: 8080)')
+  options, args = parser.parse_args(argv[1:])
+  if len(args) != 1:
+    parser.error('DOCTREEDIR is required')
+  domaindata, responses = load_build(args[0])
+  routes = RouteTable.from_build(domaindata, responses)
+  MockServer(routes, options.host, options.port)
+  print 'Serving %d routes on http://%s:%d/' % (len(domaindata['method']),
+                                                options.host, options.port)
+  try:
+    asyncore.loop(use_poll=True)
+  except KeyboardInterrupt:
+    return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Several output formats from a single read of the sources.
+
+    Run it instead of one ``sphinx-build`` per format::
+
+        python -m sphinx_http_domain.multibuild docs docs/_build \\
+            html singlehtml latexpdf man
+
+    The first builder reads the sources and executes the curl examples.
+    The others share its doctree directory: they find the environment,
+    with the HTTP domain data, and the parsed doctrees up to date, and
+    only resolve and write them.  Should they read a document again, its
+    examples get the responses recorded by the first build.
+"""
+
+import optparse
+import os
+import subprocess
+import sys
+
+from sphinx.application import Sphinx
+
+# output formats made from the output of another builder
+_make_targets = {
+  'latexpdf': ('latex', 'all-pdf'),
+  'latexpdfja': ('latex', 'all-pdf-ja'),
+}
+
+
+def build_all(srcdir, outdir, builders, confdir=None, doctreedir=None,
+              confoverrides=None, freshenv=False, warningiserror=False,
+              tags=None, status=sys.stdout, warning=sys.stderr):
+  """
+  Builds the documentation of *srcdir* with each of *builders* in turn,
+  each in the subdirectory of *outdir* named after it, and the doctrees
+  in *doctreedir*, ``outdir/doctrees`` by default.
+
+  Returns the status code of the first build that failed, or 0.
+  """
+  confdir = confdir or srcdir
+  doctreedir = doctreedir or os.path.join(outdir, 'doctrees')
+  overrides = dict(confoverrides or {})
+  for i, name in enumerate(builders):
+    buildername, target = _make_targets.get(name, (name, None))
+    builddir = os.path.join(outdir, buildername)
+    app = Sphinx(srcdir, confdir, builddir, doctreedir, buildername,
+                 overrides, status, warning, freshenv and i == 0,
+                 warningiserror, tags)
+    app.build()
+    if app.statuscode:
+      return app.statuscode
+    if target is not None:
+      status.write('running make %s in %s\n' % (target, builddir))
+      code = subprocess.call(['make', '-C', builddir, target],
+                             stdout=status, stderr=warning)
+      if code:
+        return code
+    # executed once: a document read again reuses the recorded responses
+    overrides['curl_cache'] = True
+  return 0
+
+
+def main(argv=sys.argv):
+  parser = optparse.OptionParser(
+    usage='%prog [options] SOURCEDIR OUTPUTDIR BUILDER...')
+  parser.add_option('-c', dest='confdir',
+                    help='directory of conf.py (default: SOURCEDIR)')
+  parser.add_option('-d', dest='doctreedir',
+                    help='shared doctree directory (default: '
+                         'OUTPUTDIR/doctrees)')
+  parser.add_option('-D', dest='define', action='append', default=[],
+                    help='override a setting of conf.py, as name=value')
+  parser.add_option('-t', dest='tags', action='append', default=[],
+                    help='define a tag')
+  parser.add_option('-E', dest='freshenv', action='store_true',
+                    help='read all the sources again')
+  parser.add_option('-W', dest='warningiserror', action='store_true',
+                    help='turn warnings into errors')
+  options, args = parser.parse_args(argv[1:])
+  if len(args) < 3:
+    parser.error('SOURCEDIR, OUTPUTDIR and a BUILDER are required')
+  overrides = {}
+  for define in options.define:
+    name, sep, value = define.partition('=')
+    if not sep:
+      parser.error('-D takes name=value, not %r' % define)
+    overrides[name] = value
+  return build_all(os.path.abspath(args[0]), os.path.abspath(args[1]),
+                   args[2:],
+                   confdir=options.confdir and os.path.abspath(options.confdir),
+                   doctreedir=(options.doctreedir and
+                               os.path.abspath(options.doctreedir)),
+                   confoverrides=overrides, freshenv=options.freshenv,
+                   warningiserror=options.warningiserror,
+                   tags=options.tags)
+
+
+if __name__ == '__main__':
+  sys.exit(main())
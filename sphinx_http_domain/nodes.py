@@ -128,9 +128,9 @@ class desc_http_patharg(HttpNode):
     """
     wrapper = (u'{', u'}')
 
-    def astext(self, node):
+    def astext(self):
         return (self.wrapper[0] +
-                nodes.TextElement.astext(node) +
+                nodes.TextElement.astext(self) +
                 self.wrapper[1])
 
     @staticmethod
@@ -357,3 +357,16 @@ class desc_http_example(HttpNode):
   @staticmethod
   def depart_man(self, node):
     self.body.append(self.defs['strong'][1])
+
+
+class http_responsematrix(nodes.General, nodes.Element):
+    """
+    Placeholder for the table of an ``http:responsematrix`` directive,
+    replaced once all the documents have been read.
+    """
+
+
+# All the nodes of the HTTP domain, in the order they are registered
+http_nodes = (desc_http_method, desc_http_url, desc_http_path,
+              desc_http_patharg, desc_http_query, desc_http_queryparam,
+              desc_http_fragment, desc_http_response, desc_http_example)
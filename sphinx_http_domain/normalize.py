@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Normalization of volatile fields in executed curl examples.
+"""
+
+import copy
+import re
+
+
+_path_token_re = re.compile(r'([^.\[\]]+)|\[(\*|\d+)\]')
+
+
+def parse_json_path(path):
+  """
+  Splits a JSON path such as ``$.items[*].id`` or ``meta.created`` into a
+  list of keys, list indices and ``'*'`` wildcards.
+  """
+  if path.startswith('$'):
+    path = path[1:]
+  steps = []
+  for key, index in _path_token_re.findall(path):
+    if index == '*' or key == '*':
+      steps.append('*')
+    elif index:
+      steps.append(int(index))
+    else:
+      steps.append(key)
+  return steps
+
+
+def find_json_path(value, steps):
+  """Yields every node of *value* matched by *steps*."""
+  if not steps:
+    yield value
+    return
+  step, rest = steps[0], steps[1:]
+  if isinstance(value, dict):
+    children = value.values() if step == '*' else [value.get(step)]
+  elif isinstance(value, list):
+    if step == '*':
+      children = value
+    elif isinstance(step, int) and step < len(value):
+      children = [value[step]]
+    else:
+      children = []
+  else:
+    children = []
+  for child in children:
+    if child is not None:
+      for node in find_json_path(child, rest):
+        yield node
+
+
+def mask_json_path(value, steps, replacement):
+  """
+  Replaces every node of *value* matched by *steps* with *replacement*.
+  Missing keys are ignored, so masks can be shared between endpoints.
+  """
+  if not steps:
+    return replacement
+  step, rest = steps[0], steps[1:]
+  if isinstance(value, dict):
+    keys = value.keys() if step == '*' else [step]
+    for key in keys:
+      if key in value:
+        value[key] = mask_json_path(value[key], rest, replacement)
+  elif isinstance(value, list):
+    if step == '*':
+      indexes = range(len(value))
+    elif isinstance(step, int) and step < len(value):
+      indexes = [step]
+    else:
+      indexes = []
+    for i in indexes:
+      value[i] = mask_json_path(value[i], rest, replacement)
+  return value
+
+
+class ResponseNormalizer(object):
+  """
+  Scrubs volatile values (dates, request IDs, generated IDs, timestamps) out
+  of an executed curl response, so that re-running an unchanged example
+  renders byte-identical output.
+
+  *header_allow* and *header_deny* are lists of header names, compared
+  case-insensitively; the status line is always kept.  *json_masks* maps
+  JSON paths to the value rendered in their place.  *scrub* is a list of
+  ``(pattern, replacement)`` pairs applied to every emitted line.
+  """
+
+  def __init__(self, header_allow=None, header_deny=None, json_masks=None,
+               scrub=None, sort_keys=False):
+    self.header_allow = None
+    if header_allow is not None:
+      self.header_allow = set(h.lower() for h in header_allow)
+    self.header_deny = set(h.lower() for h in header_deny or ())
+    self.json_masks = [(parse_json_path(path), replacement)
+                       for path, replacement in
+                       sorted((json_masks or {}).items())]
+    self.scrub = [(re.compile(pattern), replacement)
+                  for pattern, replacement in scrub or ()]
+    self.sort_keys = sort_keys
+
+  @classmethod
+  def from_config(cls, config):
+    return cls(header_allow=config.curl_header_allow,
+               header_deny=config.curl_header_deny,
+               json_masks=config.curl_json_masks,
+               scrub=config.curl_scrub,
+               sort_keys=config.curl_sort_keys)
+
+  def keep_header(self, line):
+    """Returns whether a raw ``Name: value`` header line is emitted."""
+    name = line.split(':', 1)[0].strip().lower()
+    if self.header_allow is not None and name not in self.header_allow:
+      return False
+    return name not in self.header_deny
+
+  def normalize_headers(self, headers):
+    lines = headers.split('\n')
+    return '\n'.join(lines[:1] +
+                     [line for line in lines[1:] if self.keep_header(line)])
+
+  def normalize_body(self, body):
+    for steps, replacement in self.json_masks:
+      body = mask_json_path(body, steps, replacement)
+    return body
+
+  def normalize(self, response):
+    """Returns a normalized copy of a response from send_curl_request."""
+    result = dict(response)
+    result['headers'] = self.normalize_headers(response['headers'])
+    if 'body' in response:
+      result['body'] = self.normalize_body(copy.deepcopy(response['body']))
+    if response.get('stream') == 'ndjson':
+      result['events'] = [self.normalize_body(copy.deepcopy(event))
+                          for event in response['events']]
+    return result
+
+  def scrub_line(self, line):
+    for pattern, replacement in self.scrub:
+      line = pattern.sub(replacement, line)
+    return line
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Operations of OpenAPI 3 and Swagger 2 specifications, read for the
+    ``http:openapi`` directive.
+
+    A specification is parsed once per build, and only indexed by
+    operation: each document expands the operations it selects into
+    ``http:method`` entries, and nothing else.
+"""
+
+import json
+import os
+from collections import OrderedDict
+
+from sphinx_http_domain.routes import HTTP_METHODS
+from sphinx_http_domain.sourceindex import FileCache
+
+
+def parse_spec(filename, data):
+  """
+  Parses the contents *data* of the specification file *filename*, JSON
+  or, if PyYAML is installed, YAML.
+  """
+  if os.path.splitext(filename)[1].lower() in ('.yaml', '.yml'):
+    try:
+      import yaml
+    except ImportError:
+      raise ValueError('PyYAML is needed to read %s' % filename)
+    return yaml.safe_load(data)
+  return json.loads(data, object_pairs_hook=OrderedDict)
+
+
+def one_line(text):
+  """Returns *text* with its whitespace collapsed, for field bodies."""
+  return ' '.join((text or '').split())
+
+
+class Spec(object):
+  """
+  A parsed specification, and the (path, method, tags) index of its
+  operations.
+  """
+
+  def __init__(self, spec):
+    self.spec = spec
+    self.base_path = ''
+    if 'swagger' in spec:
+      self.base_path = (spec.get('basePath') or '').rstrip('/')
+    self.operations = []
+    for path, item in (spec.get('paths') or {}).iteritems():
+      for method in HTTP_METHODS:
+        operation = item.get(method.lower())
+        if isinstance(operation, dict):
+          self.operations.append((path, method,
+                                  set(operation.get('tags') or ())))
+
+  def resolve(self, obj):
+    """Follows the local ``$ref`` pointers of *obj*."""
+    while isinstance(obj, dict) and '$ref' in obj:
+      ref = obj['$ref']
+      if not ref.startswith('#/'):
+        raise ValueError('can\'t follow the external reference %r' % ref)
+      obj = self.spec
+      for part in ref[2:].split('/'):
+        obj = obj[part.replace('~1', '/').replace('~0', '~')]
+    return obj
+
+  def select(self, tags=(), paths=(), methods=()):
+    """
+    Returns the (path, method) of the operations with one of the *tags*,
+    under one of the *paths* and with one of the *methods*, if given.
+    """
+    return [(path, method) for path, method, optags in self.operations
+            if (not tags or optags & set(tags)) and
+               (not paths or any(path.startswith(prefix)
+                                 for prefix in paths)) and
+               (not methods or method in methods)]
+
+  def parameter_type(self, parameter):
+    schema = parameter.get('schema', parameter)
+    if '$ref' in schema:
+      return schema['$ref'].rsplit('/', 1)[-1]
+    return schema.get('type')
+
+  def field_lines(self, path, method):
+    """Returns the doc field lines of the operation *method* of *path*."""
+    item = self.spec['paths'][path]
+    operation = item[method.lower()]
+    parameters = OrderedDict()
+    for parameter in (list(item.get('parameters') or ()) +
+                      list(operation.get('parameters') or ())):
+      parameter = self.resolve(parameter)
+      # operation parameters override those of their path
+      parameters[parameter.get('in'), parameter.get('name')] = parameter
+    lines = []
+    for (location, name), parameter in parameters.iteritems():
+      if location == 'path':
+        field = 'arg'
+      elif location == 'query':
+        field = 'param' if parameter.get('required') else 'optparam'
+      else:
+        continue
+      typ = self.parameter_type(parameter)
+      arg = '%s %s' % (typ, name) if typ else name
+      lines.append((':%s %s: %s' % (
+        field, arg, one_line(parameter.get('description')))).rstrip())
+    for code, response in (operation.get('responses') or {}).iteritems():
+      response = self.resolve(response)
+      lines.append((':response %s: %s' %
+                    (code, one_line(response.get('description')))).rstrip())
+    return lines
+
+  def operation_lines(self, path, method):
+    """
+    Returns the lines of the ``http:method`` entry of the operation
+    *method* of *path*.
+    """
+    operation = self.spec['paths'][path][method.lower()]
+    lines = ['.. http:method:: %s %s%s' % (method, self.base_path, path)]
+    if operation.get('summary'):
+      lines.append('   :title: %s' % one_line(operation['summary']))
+    if operation.get('operationId'):
+      lines.append('   :label-name: %s' % operation['operationId'])
+    lines.append('')
+    if operation.get('deprecated'):
+      lines.extend(['   Deprecated.', ''])
+    description = operation.get('description') or ''
+    if description.strip():
+      lines.extend('   ' + line if line.strip() else ''
+                   for line in description.strip().splitlines())
+      lines.append('')
+    lines.extend('   ' + line for line in self.field_lines(path, method))
+    lines.append('')
+    return lines
+
+
+class SpecCache(FileCache):
+  """Specifications parsed in a build, keyed by their path."""
+
+  def __init__(self):
+    FileCache.__init__(self, lambda filename, data:
+                       Spec(parse_spec(filename, data)))
+
+  def spec(self, filename):
+    """Returns the :class:`Spec` of the specification file *filename*."""
+    return self.get(filename)
+
+
+def get_cache(env):
+  """Returns the specification cache of the build of *env*."""
+  app = env.app
+  if getattr(app, 'http_spec_cache', None) is None:
+    app.http_spec_cache = SpecCache()
+  return app.http_spec_cache
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Endpoint by status code matrix of the ``http:responsematrix``
+    directive.
+
+    The matrix is built from the ``response`` fields the domain records
+    while reading, once every document has been read, so no doctree is
+    walked again to collect them.
+"""
+
+from docutils import nodes
+
+from sphinx.environment import NoUri
+from sphinx.util.nodes import make_refnode
+
+from sphinx_http_domain.indices import route_path
+from sphinx_http_domain.nodes import http_responsematrix
+from sphinx_http_domain.routes import HTTP_METHODS
+
+_method_order = dict((method, i) for i, method in enumerate(HTTP_METHODS))
+
+
+def response_rows(methods, fields):
+  """
+  Returns the (path, method, name, docname, status codes) of the
+  ``method`` domain data *methods*, sorted by path and method, given the
+  ``fields`` domain data.
+  """
+  rows = []
+  for name, entry in methods.iteritems():
+    route = route_path(entry[1])
+    if route is None:
+      continue
+    method, path = route
+    codes = frozenset(field[2] for field in
+                      fields.get('method-' + name, (None, ()))[1]
+                      if field[0] == 'response' and field[2])
+    rows.append((path, method, name, entry[0], codes))
+  rows.sort(key=lambda row: (row[0], _method_order.get(row[1], 99), row[2]))
+  return rows
+
+
+def code_key(code):
+  """Sorts numeric status codes first, in order, then the others."""
+  return (0, int(code), code) if code.isdigit() else (1, 0, code)
+
+
+def make_matrix(builder, fromdocname, rows, prefixes=()):
+  """
+  Returns the table of the endpoints of *rows* whose path starts with one
+  of *prefixes*, if any, against the status codes they respond with.
+  """
+  if prefixes:
+    rows = [row for row in rows
+            if any(row[0].startswith(prefix) for prefix in prefixes)]
+  codes = sorted(set().union(*[row[4] for row in rows]), key=code_key)
+  table = nodes.table(classes=['http-responsematrix'])
+  tgroup = nodes.tgroup(cols=len(codes) + 1)
+  table += tgroup
+  tgroup += nodes.colspec(colwidth=30)
+  for code in codes:
+    tgroup += nodes.colspec(colwidth=5)
+  thead = nodes.thead()
+  tgroup += thead
+  row = nodes.row()
+  thead += row
+  row += nodes.entry('', nodes.paragraph('', 'Endpoint'))
+  for code in codes:
+    row += nodes.entry('', nodes.paragraph('', code))
+  tbody = nodes.tbody()
+  tgroup += tbody
+  for path, method, name, docname, responses in rows:
+    label = '%s %s' % (method, path)
+    try:
+      ref = make_refnode(builder, fromdocname, docname, 'method-' + name,
+                         nodes.literal(label, label), label)
+    except NoUri:
+      # builders without links between documents, such as man
+      ref = nodes.literal(label, label)
+    row = nodes.row()
+    tbody += row
+    row += nodes.entry('', nodes.paragraph('', '', ref))
+    # empty cells are left bare, to keep the node count of large APIs down
+    row.extend(nodes.entry('', nodes.paragraph('', u'✓'))
+               if code in responses else nodes.entry() for code in codes)
+  return table
+
+
+def resolve_response_matrices(app, doctree, fromdocname):
+  """Replaces the ``http:responsematrix`` placeholders of *doctree*."""
+  matrices = doctree.traverse(http_responsematrix)
+  if not matrices:
+    return
+  rows = app.env.get_domain('http').response_rows()
+  for node in matrices:
+    node.replace_self(make_matrix(app.builder, fromdocname, rows,
+                                  node['prefixes']))
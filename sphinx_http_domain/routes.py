@@ -0,0 +1,356 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Route tables of web frameworks, read for the ``http:autoroutes``
+    directive.
+
+    A route table is either a static route file, with one ``METHOD PATH
+    [HANDLER]`` route per line, or a Python object: a Flask application, a
+    web.py application or URL tuple, or a list of ``(method, path,
+    handler)`` tuples.
+"""
+
+import ast
+import cPickle as pickle
+import hashlib
+import inspect
+import os
+import re
+import sys
+
+from sphinx_http_domain.sourceindex import (SourceIndex, find_module_file,
+                                            get_source_index)
+from sphinx_http_domain.utils import import_object, split_object_path
+
+HTTP_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS')
+
+_flask_arg_re = re.compile(r'<(?:[^:<>]+:)?([^<>]+)>')
+_colon_arg_re = re.compile(r'(^|/):(\w+)')
+_named_group_re = re.compile(r'\(\?P<(\w+)>')
+
+
+def convert_regex(pattern):
+  """
+  Converts a route regular expression, such as ``^/models/(\\d+)/?$``,
+  into a path with ``{arg}`` arguments: named groups keep their name, the
+  others are numbered, and non-capturing groups are dropped.
+  """
+  if pattern.startswith('^'):
+    pattern = pattern[1:]
+  if pattern.endswith('$') and not pattern.endswith('\\$'):
+    pattern = pattern[:-1]
+  path = []
+  count = 0
+  i = 0
+  while i < len(pattern):
+    c = pattern[i]
+    if c == '\\':
+      path.append(pattern[i + 1:i + 2])
+      i += 2
+      continue
+    if c in '?*+':
+      # quantifiers of literal characters, such as an optional slash
+      i += 1
+      continue
+    if c != '(':
+      path.append(c)
+      i += 1
+      continue
+    depth = 0
+    j = i
+    while j < len(pattern):
+      if pattern[j] == '\\':
+        j += 1
+      elif pattern[j] == '(':
+        depth += 1
+      elif pattern[j] == ')':
+        depth -= 1
+        if depth == 0:
+          break
+      j += 1
+    group = pattern[i:j + 1]
+    m = _named_group_re.match(group)
+    if m is not None:
+      path.append('{%s}' % m.group(1))
+    elif not group.startswith('(?'):
+      count += 1
+      path.append('{arg%d}' % count)
+    i = j + 1
+  return ''.join(path)
+
+
+def convert_path(path):
+  """
+  Converts the arguments of a route path into ``{arg}`` form: Flask
+  ``<int:id>``, ``:id`` and regular expression groups.
+  """
+  if '(' in path or path.startswith('^') or path.endswith('$'):
+    path = convert_regex(path)
+  path = _flask_arg_re.sub(r'{\1}', path)
+  return _colon_arg_re.sub(r'\1{\2}', path)
+
+
+def read_route_file(filename):
+  """
+  Returns the (method, path, handler) tuples of a static route file.
+  Blank lines and ``#`` comments are ignored, and the handler is optional.
+  """
+  routes = []
+  with open(filename) as f:
+    for line in f:
+      parts = line.split('#', 1)[0].split()
+      if len(parts) < 2:
+        continue
+      handler = parts[2] if len(parts) > 2 else None
+      routes.append((parts[0].upper(), parts[1], handler))
+  return routes
+
+
+def table_routes(table, methods):
+  """
+  Returns the (method, path, handler) tuples of a route *table*.  Routes
+  given without a method are expanded into one route for each method
+  *methods* returns for their handler.
+  """
+  if hasattr(table, 'url_map') and hasattr(table, 'view_functions'):
+    # a Flask application
+    routes = []
+    for rule in table.url_map.iter_rules():
+      if rule.endpoint == 'static':
+        continue
+      view = table.view_functions.get(rule.endpoint)
+      for method in sorted(rule.methods - set(['HEAD', 'OPTIONS'])):
+        routes.append((method, rule.rule, view))
+    return routes
+  # a web.py application keeps its URL table in its mapping
+  table = getattr(table, 'mapping', table)
+  if isinstance(table, dict):
+    table = sorted(table.items())
+  table = list(table)
+  if table and all(isinstance(item, basestring) for item in table):
+    # a web.py URL tuple: path, handler, path, handler...
+    table = zip(table[::2], table[1::2])
+  routes = []
+  for item in table:
+    if len(item) == 3:
+      routes.append((item[0].upper(),) + tuple(item[1:]))
+    else:
+      path, handler = item
+      for method in methods(handler):
+        routes.append((method, path, handler))
+  return routes
+
+
+class ImportedHandlers(object):
+  """
+  Handlers of a route table found by importing them.  Handler names are
+  looked up in the module *modname* first.
+  """
+
+  def __init__(self, modname):
+    self.module = None
+    if modname:
+      __import__(modname)
+      self.module = sys.modules[modname]
+    self.files = set()
+    self.note_file(self.module)
+
+  def note_file(self, obj):
+    try:
+      self.files.add(os.path.abspath(inspect.getsourcefile(obj)))
+    except (TypeError, IOError):
+      pass
+
+  def resolve(self, handler):
+    if isinstance(handler, basestring):
+      if self.module is not None and hasattr(self.module, handler):
+        handler = getattr(self.module, handler)
+      else:
+        handler = import_object(handler)
+    self.note_file(inspect.getmodule(handler))
+    return handler
+
+  def methods(self, handler):
+    handler = self.resolve(handler)
+    return [method for method in HTTP_METHODS if hasattr(handler, method)]
+
+  def docstring(self, handler, method):
+    if handler is None:
+      return None
+    handler = self.resolve(handler)
+    return (getattr(getattr(handler, method, None), '__doc__', None) or
+            getattr(handler, '__doc__', None))
+
+
+class ParsedHandlers(object):
+  """
+  Handlers of a route table found in the source index, by their dotted
+  names, without importing them.  Handler names are looked up in the
+  module *modname* first.
+  """
+
+  def __init__(self, index, modname):
+    self.index = index
+    self.modname = modname
+    self.files = set()
+
+  def find(self, handler):
+    """Returns the docstrings of the module of *handler*, and its name."""
+    candidates = []
+    if self.modname:
+      candidates.append((self.modname, handler))
+    if '.' in handler:
+      candidates.append(tuple(handler.rsplit('.', 1)))
+    for modname, name in candidates:
+      filename = find_module_file(modname)
+      if filename is None:
+        continue
+      docstrings = self.index.docstrings(filename)
+      if name in docstrings:
+        self.files.add(filename)
+        return docstrings, name
+    raise ValueError('can\'t find handler %r' % handler)
+
+  def methods(self, handler):
+    docstrings, name = self.find(handler)
+    return [method for method in HTTP_METHODS
+            if '%s.%s' % (name, method) in docstrings]
+
+  def docstring(self, handler, method):
+    if handler is None:
+      return None
+    docstrings, name = self.find(handler)
+    return docstrings.get('%s.%s' % (name, method)) or docstrings[name]
+
+
+def parse_table(filename, attr):
+  """
+  Returns the route table assigned to *attr* in the source file
+  *filename*, which must be a literal.
+  """
+  with open(filename, 'rb') as f:
+    tree = ast.parse(f.read())
+  for node in tree.body:
+    if (isinstance(node, ast.Assign) and
+        any(isinstance(target, ast.Name) and target.id == attr
+            for target in node.targets)):
+      return ast.literal_eval(node.value)
+  raise ValueError('can\'t find a literal %r in %s' % (attr, filename))
+
+
+def load_routes(source, filename, mode, index):
+  """
+  Returns the (method, path, docstring) tuples of the route table
+  *source*, which is read from *filename* if that is not None, and the set
+  of source files they come from.
+
+  In ``ast`` *mode*, Python route tables must be literals, and handlers
+  are looked up in the source *index* by name.
+  """
+  if filename is not None:
+    table = read_route_file(filename)
+    modname = None
+    files = set([filename])
+  else:
+    modname, attr = split_object_path(source)
+    if mode == 'ast':
+      path = find_module_file(modname)
+      if path is None:
+        raise ValueError('can\'t find the source of %r' % modname)
+      table = parse_table(path, attr)
+      files = set([path])
+    else:
+      table = import_object(source)
+      files = set()
+  if mode == 'ast':
+    handlers = ParsedHandlers(index, modname)
+  else:
+    handlers = ImportedHandlers(modname)
+  routes = []
+  for method, path, handler in table_routes(table, handlers.methods):
+    routes.append((method, convert_path(path),
+                   handlers.docstring(handler, method)))
+  return routes, files | handlers.files
+
+
+def source_digest(source, filename):
+  """
+  Returns the digest of the route table *source*: that of the route file,
+  or of the source file of the module defining it, found without
+  importing it.
+  """
+  if filename is None:
+    filename = find_module_file(split_object_path(source)[0])
+  if filename is None:
+    return None
+  with open(filename, 'rb') as f:
+    return hashlib.sha1(f.read()).hexdigest()
+
+
+class RouteCache(object):
+  """
+  Routes read from route tables, persisted in *filename* between builds.
+
+  Routes are keyed by their table, and reused as long as the digest of
+  the table source and the mtimes of the source files of their handlers
+  are unchanged.
+  """
+
+  def __init__(self, filename=None, index=None):
+    self.filename = filename
+    self.tables = {}  # key -> digest, {path: mtime}, routes
+    self.index = index or SourceIndex()
+    self.dirty = False
+    if filename and os.path.exists(filename):
+      try:
+        with open(filename, 'rb') as f:
+          self.tables = pickle.load(f)
+      except Exception:
+        # a stale or corrupt cache is simply rebuilt
+        self.tables = {}
+
+  def routes(self, source, filename, mode):
+    """
+    Returns the routes of the route table *source*, and the source files
+    they come from.
+    """
+    key = (source, filename, mode)
+    digest = source_digest(source, filename)
+    cached = self.tables.get(key)
+    if cached is not None and digest is not None and cached[0] == digest:
+      try:
+        if all(os.stat(path).st_mtime == mtime
+               for path, mtime in cached[1].iteritems()):
+          return cached[2], set(cached[1])
+      except OSError:
+        pass
+    routes, files = load_routes(source, filename, mode, self.index)
+    self.tables[key] = (digest, dict((path, os.stat(path).st_mtime)
+                                     for path in files), routes)
+    self.dirty = True
+    return routes, files
+
+  def save(self):
+    self.index.save()
+    if not self.filename or not self.dirty:
+      return
+    with open(self.filename, 'wb') as f:
+      pickle.dump(self.tables, f, pickle.HIGHEST_PROTOCOL)
+    self.dirty = False
+
+
+def get_cache(env):
+  """Returns the route cache of the build of *env*."""
+  app = env.app
+  if getattr(app, 'http_route_cache', None) is None:
+    app.http_route_cache = RouteCache(
+      os.path.join(env.doctreedir, 'http-routes.pickle'),
+      get_source_index(app))
+  return app.http_route_cache
+
+
+def save_cache(app, exception):
+  if getattr(app, 'http_route_cache', None) is not None:
+    app.http_route_cache.save()
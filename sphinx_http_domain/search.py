@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Endpoint search index of the HTTP domain.
+
+    HTML builds write ``_static/http-endpoints.js``, a prefix tree of the
+    path segments of every ``http:method``, which the search page loads to
+    answer URL-shaped queries such as ``GET /api/models/{id}``.
+"""
+
+import json
+import os
+
+from sphinx_http_domain.indices import route_path
+
+
+def endpoint_segments(path):
+  """
+  Returns the segments of *path*, with each segment holding an ``{arg}``
+  replaced by ``*``.
+  """
+  return ['*' if '{' in segment else segment
+          for segment in path.strip('/').split('/')]
+
+
+def build_endpoint_tree(methods, get_uri):
+  """
+  Returns the prefix tree of the ``method`` domain data *methods*.
+
+  Every node is a dict whose ``c`` maps path segments to child nodes,
+  and whose ``e`` lists the ``[method, page, anchor, title]`` of the
+  routes ending there.  Pages are indices into the returned list of
+  URIs, as returned by *get_uri* for a docname.
+  """
+  tree = {}
+  pages = []
+  page_ids = {}
+  for name, entry in sorted(methods.iteritems()):
+    docname, sig, title = entry[:3]
+    route = route_path(sig)
+    if route is None:
+      continue
+    method, path = route
+    if docname not in page_ids:
+      page_ids[docname] = len(pages)
+      pages.append(get_uri(docname))
+    node = tree
+    for segment in endpoint_segments(path):
+      node = node.setdefault('c', {}).setdefault(segment, {})
+    node.setdefault('e', []).append(
+      [method, page_ids[docname], 'method-' + name,
+       title if title != sig else path])
+  return tree, pages
+
+
+def write_endpoint_index(app, exception):
+  if (exception is not None or not app.config.http_endpoint_search or
+      app.builder.format != 'html'):
+    return
+  tree, pages = build_endpoint_tree(app.env.domaindata['http']['method'],
+                                    app.builder.get_target_uri)
+  data = json.dumps({'tree': tree, 'pages': pages}, sort_keys=True,
+                    separators=(',', ':'))
+  with open(os.path.join(app.outdir, '_static', 'http-endpoints.js'),
+            'w') as f:
+    f.write('HTTPEndpoints.setIndex(%s);\n' % data)
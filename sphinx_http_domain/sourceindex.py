@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Index of the docstrings of Python source files, found by parsing the
+    files rather than importing them.
+"""
+
+import ast
+import cPickle as pickle
+import hashlib
+import imp
+import os
+import sys
+
+
+def find_module_file(modname, path=None):
+  """
+  Returns the source file of the module *modname*, searched for in *path*
+  (``sys.path`` by default) without importing it or its packages, or None.
+  """
+  path = sys.path if path is None else path
+  filename = None
+  for part in modname.split('.'):
+    try:
+      f, filename, (_, _, kind) = imp.find_module(part, path)
+    except ImportError:
+      return None
+    if f is not None:
+      f.close()
+    if kind == imp.PKG_DIRECTORY:
+      path = [filename]
+      filename = os.path.join(filename, '__init__.py')
+    elif kind == imp.PY_SOURCE:
+      path = []
+    else:
+      # compiled or extension modules have no source to parse
+      return None
+  return os.path.abspath(filename)
+
+
+def parse_docstrings(source):
+  """
+  Returns a dict mapping the dotted names of the classes and functions
+  defined in *source*, such as ``Handler.GET``, to their docstrings.
+  """
+  docstrings = {}
+
+  def visit(body, prefix):
+    for node in body:
+      if isinstance(node, (ast.ClassDef, ast.FunctionDef)):
+        name = prefix + node.name
+        docstrings[name] = ast.get_docstring(node, clean=False)
+        if isinstance(node, ast.ClassDef):
+          visit(node.body, name + '.')
+
+  visit(ast.parse(source).body, '')
+  return docstrings
+
+
+class FileCache(object):
+  """
+  What *parse* makes of files, given their path and contents, keyed by
+  their path.  A file is only parsed again once both its mtime and the
+  digest of its contents have changed.
+  """
+
+  def __init__(self, parse):
+    self.parse = parse
+    self.files = {}  # path -> mtime, digest, result
+    self.dirty = False
+
+  def get(self, path):
+    """Returns what *parse* makes of the file *path*."""
+    mtime = os.stat(path).st_mtime
+    cached = self.files.get(path)
+    if cached is not None and cached[0] == mtime:
+      return cached[2]
+    with open(path, 'rb') as f:
+      data = f.read()
+    digest = hashlib.sha1(data).hexdigest()
+    if cached is not None and cached[1] == digest:
+      result = cached[2]
+    else:
+      result = self.parse(path, data)
+    self.files[path] = (mtime, digest, result)
+    self.dirty = True
+    return result
+
+
+class SourceIndex(FileCache):
+  """
+  Docstrings of the classes and functions of Python source files, kept in
+  *filename* between builds.
+  """
+
+  def __init__(self, filename=None):
+    FileCache.__init__(self, lambda path, source: parse_docstrings(source))
+    self.filename = filename
+    if filename and os.path.exists(filename):
+      try:
+        with open(filename, 'rb') as f:
+          self.files = pickle.load(f)
+      except Exception:
+        # a stale or corrupt index is simply rebuilt
+        self.files = {}
+
+  def docstrings(self, path):
+    """Returns the docstrings of the source file *path*."""
+    return self.get(path)
+
+  def lookup(self, modname, objpath):
+    """
+    Returns the (source file, docstring) of the object *objpath*, a list
+    of names, of the module *modname*, or None if it is not found.
+    """
+    path = find_module_file(modname)
+    if path is None:
+      return None
+    docstrings = self.docstrings(path)
+    name = '.'.join(objpath)
+    if name not in docstrings:
+      return None
+    return path, docstrings[name]
+
+  def save(self):
+    if not self.filename or not self.dirty:
+      return
+    with open(self.filename, 'wb') as f:
+      pickle.dump(self.files, f, pickle.HIGHEST_PROTOCOL)
+    self.dirty = False
+
+
+def get_source_index(app):
+  """
+  Returns the source index of the build of *app*, shared by everything
+  that reads docstrings from source files.
+  """
+  if getattr(app, 'http_source_index', None) is None:
+    app.http_source_index = SourceIndex(os.path.join(app.doctreedir,
+                                                     'http-sources.pickle'))
+  return app.http_source_index
+
+
+def save_source_index(app, exception):
+  if getattr(app, 'http_source_index', None) is not None:
+    app.http_source_index.save()
@@ -0,0 +1,91 @@
+/*
+ * http-search.js
+ * ~~~~~~~~~~~~~~
+ *
+ * Answers URL-shaped queries on the search page, such as
+ * "GET /api/models/12", from the endpoint index of the HTTP domain.
+ */
+var HTTPEndpoints = (function () {
+  var maxResults = 50;
+  var query = null;
+
+  function parse(text) {
+    var m = /^\s*(?:([a-z]+)\s+)?(\/\S*)\s*$/i.exec(text);
+    if (m === null)
+      return null;
+    var path = m[2].split(/[?#]/)[0];
+    var segments = path.replace(/^\/+|\/+$/g, '');
+    return {
+      method: m[1] ? m[1].toUpperCase() : null,
+      segments: segments === '' ? [] : segments.split('/'),
+      // "/api/" only lists the routes below "api", "/api" also "api*"
+      complete: /\/$/.test(path)
+    };
+  }
+
+  function collect(node, results) {
+    var i, key;
+    for (i = 0; node.e && i < node.e.length; i++)
+      results.push(node.e[i]);
+    for (key in node.c)
+      collect(node.c[key], results);
+  }
+
+  // Walks the prefix tree: {arg} query segments and "*" tree segments
+  // match any segment, and the last query segment matches as a prefix.
+  function walk(node, segments, i, complete, results) {
+    if (i === segments.length) {
+      collect(node, results);
+      return;
+    }
+    var segment = segments[i];
+    var last = i === segments.length - 1 && !complete;
+    var wildcard = segment.charAt(0) === '{';
+    for (var key in node.c) {
+      if (key === segment || key === '*' || wildcard ||
+          (last && key.indexOf(segment) === 0))
+        walk(node.c[key], segments, i + 1, complete, results);
+    }
+  }
+
+  function render(index) {
+    var results = [];
+    walk(index.tree, query.segments, 0, query.complete, results);
+    results = $.grep(results, function (result) {
+      return query.method === null || result[0] === query.method;
+    }).slice(0, maxResults);
+    if (!results.length)
+      return;
+    var list = $('<ul class="search"/>');
+    $.each(results, function (_, result) {
+      var link = $('<a/>')
+        .attr('href', DOCUMENTATION_OPTIONS.URL_ROOT + index.pages[result[1]] +
+              '#' + result[2])
+        .text(result[0] + ' ' + result[3]);
+      list.append($('<li/>').append(link));
+    });
+    $('<div id="http-endpoint-results"/>')
+      .append($('<h2/>').text('HTTP endpoints'))
+      .append(list)
+      .insertBefore('#search-results');
+  }
+
+  $(function () {
+    if (!$('#search-results').length)
+      return;
+    var text = $.getQueryParameters().q;
+    query = text ? parse(text[0]) : null;
+    if (query === null)
+      return;
+    var script = document.createElement('script');
+    script.src = DOCUMENTATION_OPTIONS.URL_ROOT + '_static/http-endpoints.js';
+    document.body.appendChild(script);
+  });
+
+  return {
+    setIndex: function (index) {
+      if (query !== null)
+        render(index);
+    }
+  };
+})();
@@ -0,0 +1,33 @@
+/*
+ * http-watch.js
+ * ~~~~~~~~~~~~~
+ *
+ * Reloads the page when the watch mode of the HTTP domain finishes a
+ * rebuild.
+ */
+(function () {
+  var stamp = null;
+  var root = (typeof DOCUMENTATION_OPTIONS !== 'undefined') ?
+    DOCUMENTATION_OPTIONS.URL_ROOT : '';
+
+  function poll() {
+    var request = new XMLHttpRequest();
+    request.onload = function () {
+      if (request.status === 200) {
+        if (stamp !== null && stamp !== request.responseText) {
+          window.location.reload();
+          return;
+        }
+        stamp = request.responseText;
+      }
+      window.setTimeout(poll, 500);
+    };
+    request.onerror = function () {
+      window.setTimeout(poll, 2000);
+    };
+    request.open('GET', root + '_static/http-watch.json?' + Date.now());
+    request.send();
+  }
+
+  poll();
+})();
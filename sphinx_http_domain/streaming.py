@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Bounded capture of streaming responses.
+
+    Responses with a streaming content type, NDJSON or server-sent events,
+    are read incrementally and only up to a number of events, a number of
+    body bytes or a number of seconds, so that an example of an endless
+    feed neither hangs the build nor exhausts its memory.
+"""
+
+import json
+import re
+import time
+
+# streaming content types, and how their events are delimited
+STREAM_TYPES = {
+  'application/x-ndjson': 'ndjson',
+  'application/ndjson': 'ndjson',
+  'application/jsonl': 'ndjson',
+  'application/x-jsonlines': 'ndjson',
+  'application/stream+json': 'ndjson',
+  'text/event-stream': 'sse',
+}
+
+_content_type_re = re.compile(r'^content-type:\s*([^;\s]+)',
+                              re.IGNORECASE | re.MULTILINE)
+_sse_delimiter_re = re.compile(r'\r?\n\r?\n')
+
+
+def stream_kind(headers):
+  """
+  Returns the kind of stream, ``'ndjson'`` or ``'sse'``, announced by the
+  content type of the response *headers*, or None.
+  """
+  m = _content_type_re.search(headers)
+  if m is None:
+    return None
+  return STREAM_TYPES.get(m.group(1).lower())
+
+
+def split_events(kind, body):
+  """
+  Returns the complete events of the stream *body*: the parsed JSON
+  documents of an NDJSON stream, or the raw text of server-sent events.
+  """
+  if kind == 'ndjson':
+    lines = body.split('\n')[:-1]
+    return [json.loads(line) for line in lines if line.strip()]
+  events = _sse_delimiter_re.split(body)[:-1]
+  return [event.replace('\r\n', '\n') for event in events if event.strip()]
+
+
+def event_ends(kind, body):
+  """Returns the offsets of the ends of the complete events of *body*."""
+  ends = []
+  start = 0
+  if kind == 'ndjson':
+    end = body.find('\n')
+    while end >= 0:
+      if body[start:end].strip():
+        ends.append(end + 1)
+      start = end + 1
+      end = body.find('\n', start)
+    return ends
+  for m in _sse_delimiter_re.finditer(body):
+    if body[start:m.start()].strip():
+      ends.append(m.end())
+    start = m.end()
+  return ends
+
+
+class StreamLimits(object):
+  """
+  How much of a streaming response to capture: at most *events* events,
+  *bytes* bytes of body and *seconds* seconds.  None means no limit.
+  """
+
+  def __init__(self, events=None, bytes=None, seconds=None):
+    self.events = events
+    self.bytes = bytes
+    self.seconds = seconds
+
+  @classmethod
+  def from_config(cls, config):
+    return cls(config.curl_stream_events, config.curl_stream_bytes,
+               config.curl_stream_timeout)
+
+
+class StreamCapture(object):
+  """
+  Accumulates the raw ``curl -i`` output of a response, chunk by chunk,
+  and tells when a streaming response has been captured far enough.
+  """
+
+  def __init__(self, limits):
+    self.limits = limits
+    self.start = time.time()
+    self.chunks = []
+    self.size = 0
+    # offset of the body, once the final headers have been received
+    self.body_start = None
+    self.kind = None
+    self.deadline = None
+
+  def value(self):
+    return ''.join(self.chunks)
+
+  def find_headers(self):
+    """Looks for the end of the final, non-``1xx``, response headers."""
+    raw = self.value()
+    offset = 0
+    while True:
+      end = raw.find('\r\n\r\n', offset)
+      if end < 0:
+        return
+      headers = raw[offset:end]
+      parts = headers.split(None, 2)
+      if (len(parts) > 1 and parts[1].isdigit() and
+          100 <= int(parts[1]) < 200):
+        offset = end + 4
+        continue
+      self.body_start = end + 4
+      self.kind = stream_kind(headers)
+      if self.kind is not None and self.limits.seconds:
+        self.deadline = self.start + self.limits.seconds
+      return
+
+  def feed(self, chunk):
+    """
+    Adds a *chunk* of output.  Returns False once the capture should stop.
+    """
+    self.chunks.append(chunk)
+    self.size += len(chunk)
+    if self.body_start is None:
+      self.find_headers()
+      if self.body_start is None:
+        return True
+    if self.kind is None:
+      return True
+    limits = self.limits
+    body_size = self.size - self.body_start
+    if limits.bytes is not None and body_size >= limits.bytes:
+      return False
+    if limits.events is not None and '\n' in chunk:
+      body = self.value()[self.body_start:]
+      if len(event_ends(self.kind, body)) >= limits.events:
+        return False
+    return not self.expired()
+
+  def timeout(self):
+    """Returns the seconds left to read a stream, or None."""
+    if self.deadline is None:
+      return None
+    return max(0, self.deadline - time.time())
+
+  def expired(self):
+    return self.deadline is not None and time.time() >= self.deadline
+
+  def result(self):
+    """
+    Returns the raw output captured, cut after the last complete event
+    within the limits for a streaming response.
+    """
+    raw = self.value()
+    if self.kind is None:
+      return raw
+    head, body = raw[:self.body_start], raw[self.body_start:]
+    if self.limits.bytes is not None:
+      body = body[:self.limits.bytes]
+    ends = event_ends(self.kind, body)
+    if self.limits.events is not None:
+      ends = ends[:self.limits.events]
+    return head + body[:ends[-1] if ends else 0]
@@ -6,7 +6,10 @@
     Utilities for the HTTP domain.
 """
 
+import Queue
 import re
+import sys
+import threading
 import unicodedata
 
 
@@ -35,3 +38,80 @@ def slugify_url(value):
     characters, and converts non-alpha characters to hyphens.
     """
     return slugify(value, strip_re=_slugify_strip_url_re)
+
+
+def split_object_path(name):
+    """
+    Returns the module name and attribute of an object path, given as
+    ``module:attr`` or ``module.attr``.
+    """
+    if ':' in name:
+        return name.split(':', 1)
+    return name.rsplit('.', 1)
+
+
+def import_object(name):
+    """
+    Imports the object *name*, given as ``module.attr`` or ``module:attr``.
+    """
+    modname, attr = split_object_path(name)
+    __import__(modname)
+    obj = sys.modules[modname]
+    for part in attr.split('.'):
+        obj = getattr(obj, part)
+    return obj
+
+
+def run_concurrently(func, items, workers):
+    """
+    Calls *func* on every item of *items* from a pool of *workers* threads.
+
+    Returns the results in the order of *items*.  Exceptions raised by
+    *func* are returned in place of its result.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    queue = Queue.Queue()
+    for i, item in enumerate(items):
+        queue.put((i, item))
+
+    def work():
+        while True:
+            try:
+                i, item = queue.get_nowait()
+            except Queue.Empty:
+                return
+            try:
+                results[i] = func(item)
+            except Exception, e:
+                results[i] = e
+
+    threads = [threading.Thread(target=work)
+               for _ in range(max(1, min(workers, len(items))))]
+    for thread in threads:
+        thread.setDaemon(True)
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def parse_matrix(text):
+    """
+    Parses a parameter matrix, such as ``{METRIC} = cpu, memory; {WINDOW} =
+    1h, 1d``, into (token, values) pairs.
+    """
+    matrix = []
+    for part in text.split(';'):
+        if not part.strip():
+            continue
+        token, sep, values = part.partition('=')
+        token = token.strip()
+        values = [value.strip() for value in values.split(',')
+                  if value.strip()]
+        if not sep or not token or not values:
+            raise ValueError('invalid curl matrix: %r' % text)
+        if not token.startswith('{'):
+            token = '{%s}' % token
+        matrix.append((token, values))
+    return matrix
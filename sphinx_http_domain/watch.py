@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+    sphinx.domains.http
+    ~~~~~~~~~~~~~~~~~~~
+
+    Watch mode: rebuilds the documentation whenever a source file changes,
+    and serves it with live reload.
+
+    Run it with::
+
+        python -m sphinx_http_domain.watch SOURCEDIR OUTPUTDIR
+
+    The same ``Sphinx`` application is kept in memory between rebuilds, so
+    only the changed documents are read again, executed examples come from
+    the example cache, and besides the changed documents only the pages
+    referring to an HTTP entry whose description changed are rewritten.
+"""
+
+import optparse
+import os
+import posixpath
+import sys
+import threading
+import time
+import urllib
+from BaseHTTPServer import HTTPServer
+from SimpleHTTPServer import SimpleHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+from sphinx.application import Sphinx
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+  daemon_threads = True
+
+
+def make_handler(root):
+  """Returns a request handler class serving the files below *root*."""
+
+  class Handler(SimpleHTTPRequestHandler):
+    def translate_path(self, urlpath):
+      urlpath = posixpath.normpath(urllib.unquote(urlpath.split('?', 1)[0]))
+      parts = [part for part in urlpath.split('/')
+               if part and part not in (os.curdir, os.pardir)]
+      return os.path.join(root, *parts)
+
+    def log_message(self, format, *args):
+      pass
+
+  return Handler
+
+
+def snapshot(srcdir, ignore):
+  """Returns a dict mapping each file below *srcdir* to its mtime."""
+  mtimes = {}
+  for dirpath, dirnames, filenames in os.walk(srcdir):
+    dirnames[:] = [d for d in dirnames if not d.startswith('.') and
+                   os.path.abspath(os.path.join(dirpath, d)) not in ignore]
+    for filename in filenames:
+      filename = os.path.join(dirpath, filename)
+      try:
+        mtimes[filename] = os.stat(filename).st_mtime
+      except OSError:
+        pass
+  return mtimes
+
+
+def main(argv=sys.argv):
+  parser = optparse.OptionParser(
+    usage='%prog [options] SOURCEDIR OUTPUTDIR')
+  parser.add_option('-b', dest='builder', default='html',
+                    help='builder to use (default: html)')
+  parser.add_option('-d', dest='doctreedir',
+                    help='path for the cached environment and doctrees '
+                         '(default: OUTPUTDIR/.doctrees)')
+  parser.add_option('-p', dest='port', type='int', default=8000,
+                    help='port to serve the output on, 0 to not serve it '
+                         '(default: 8000)')
+  parser.add_option('-i', dest='interval', type='float', default=0.3,
+                    help='seconds between checks for changes')
+  options, args = parser.parse_args(argv[1:])
+  if len(args) != 2:
+    parser.error('SOURCEDIR and OUTPUTDIR are required')
+  srcdir, outdir = [os.path.abspath(arg) for arg in args]
+  doctreedir = os.path.abspath(options.doctreedir or
+                               os.path.join(outdir, '.doctrees'))
+
+  app = Sphinx(srcdir, srcdir, outdir, doctreedir, options.builder,
+               {'curl_cache': True, 'http_watch_reload': True},
+               sys.stdout, sys.stderr)
+  app.build()
+
+  if options.port:
+    server = ThreadingHTTPServer(('127.0.0.1', options.port),
+                                 make_handler(outdir))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.setDaemon(True)
+    thread.start()
+    print 'Serving %s on http://127.0.0.1:%d/' % (outdir, options.port)
+
+  ignore = set([outdir, doctreedir])
+  mtimes = snapshot(srcdir, ignore)
+  try:
+    while True:
+      time.sleep(options.interval)
+      current = snapshot(srcdir, ignore)
+      if current == mtimes:
+        continue
+      mtimes = current
+      start = time.time()
+      try:
+        app.build()
+      except Exception, e:
+        print >>sys.stderr, 'Build failed: %s' % e
+        continue
+      print 'Rebuilt in %.2fs' % (time.time() - start)
+  except KeyboardInterrupt:
+    return 0
+
+
+if __name__ == '__main__':
+  sys.exit(main())